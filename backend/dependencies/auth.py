@@ -1,12 +1,25 @@
 import os
 import json
+import asyncio
+import hashlib
+import time
+import requests
+from cachetools import TLRUCache
 from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
+from fastapi.security import OAuth2PasswordBearer, HTTPBearer, HTTPAuthorizationCredentials
+from google.auth import jwt as google_jwt
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 from firebase_admin import auth
 import firebase_admin
 from firebase_admin import credentials
 
+# Firebase ID 토큰 서명 키 (공개 인증서) 주소
+FIREBASE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+# 검증된 토큰 캐시 크기 / 최대 TTL (초, 토큰의 exp 를 넘지 않음)
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', '10000'))
+AUTH_TOKEN_CACHE_MAX_TTL = int(os.getenv('AUTH_TOKEN_CACHE_MAX_TTL', '3600'))
+
 # Firebase Admin SDK 초기화
 def initialize_firebase():
     """Firebase Admin SDK를 초기화합니다."""
@@ -57,25 +70,112 @@ def initialize_firebase():
     else:
         print("Firebase Admin SDK가 이미 초기화되어 있습니다.")
 
-# 모듈 로드 시 초기화
-initialize_firebase()
+def ensure_firebase_initialized():
+    """Firebase Admin SDK가 초기화되었는지 확인하고, 필요시 초기화합니다."""
+    if not firebase_admin._apps:
+        print("Firebase Admin SDK가 초기화되지 않았습니다. 초기화 시도...")
+        initialize_firebase()
+
+
+# 서명 키 캐시 (백그라운드에서 Cache-Control max-age 에 맞춰 갱신)
+_signing_keys = {"certs": None, "expires_at": 0.0}
+
+
+def _refresh_signing_keys() -> int:
+    """Google 공개 인증서를 가져와 캐시에 저장하고, 다음 갱신까지의 시간(초)을 반환합니다."""
+    response = requests.get(FIREBASE_CERTS_URL, timeout=10)
+    response.raise_for_status()
+
+    max_age = 3600
+    for directive in response.headers.get("Cache-Control", "").split(","):
+        directive = directive.strip()
+        if directive.startswith("max-age="):
+            max_age = int(directive[len("max-age="):])
+
+    _signing_keys["certs"] = response.json()
+    _signing_keys["expires_at"] = time.time() + max_age
+    return max_age
+
+
+async def refresh_signing_keys_forever():
+    """서명 키를 만료 전에 주기적으로 갱신합니다. (lifespan 에서 백그라운드 태스크로 실행)"""
+    while True:
+        try:
+            max_age = await run_in_threadpool(_refresh_signing_keys)
+            delay = max(60, int(max_age * 0.9))
+        except Exception as e:
+            print(f"Firebase 서명 키 갱신 실패: {e}")
+            delay = 60
+        await asyncio.sleep(delay)
+
+
+def _verify_with_cached_keys(token: str) -> dict:
+    """캐시된 서명 키로 토큰을 로컬 검증합니다. (네트워크 I/O 없음)"""
+    certs = _signing_keys["certs"]
+    project_id = firebase_admin.get_app().project_id
+    if not certs or not project_id:
+        raise ValueError("서명 키 또는 프로젝트 ID가 아직 준비되지 않았습니다.")
+
+    claims = google_jwt.decode(token, certs=certs, audience=project_id)
+    if claims.get("iss") != f"https://securetoken.google.com/{project_id}":
+        raise ValueError("토큰 발급자(iss)가 올바르지 않습니다.")
+    uid = claims.get("sub")
+    if not uid or len(uid) > 128:
+        raise ValueError("토큰 subject(sub)가 올바르지 않습니다.")
+    claims["uid"] = uid
+    return claims
 
+
+def _token_cache_ttu(_key, value, now):
+    # value = (uid, exp). 모노토닉 타이머 기준 만료 시각 계산
+    _, exp = value
+    return now + min(exp - time.time(), AUTH_TOKEN_CACHE_MAX_TTL)
+
+
+# 토큰 원문 대신 SHA-256 해시를 키로 사용
+_verified_tokens = TLRUCache(maxsize=AUTH_TOKEN_CACHE_SIZE, ttu=_token_cache_ttu)
+
+
+async def verify_firebase_token(token: str) -> str:
+    """
+    Firebase ID 토큰을 검증하고 UID를 반환합니다.
+    한 번 검증된 토큰은 exp 까지 캐시되어 딕셔너리 조회로 끝납니다.
+    """
+    key = hashlib.sha256(token.encode()).hexdigest()
+    cached = _verified_tokens.get(key)
+    if cached:
+        return cached[0]
+
+    ensure_firebase_initialized()
+    try:
+        decoded_token = _verify_with_cached_keys(token)
+    except Exception:
+        # 키가 아직 없거나 교체된 경우: SDK 검증(키 fetch 포함)을 스레드풀에서 실행
+        decoded_token = await run_in_threadpool(auth.verify_id_token, token)
+
+    uid = decoded_token["uid"]
+    _verified_tokens[key] = (uid, decoded_token["exp"])
+    print(f"토큰 검증 성공: UID = {uid}")
+    return uid
+
+
+auth_scheme = HTTPBearer()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 class User(BaseModel):
     uid: str
 
+# ✅ Firebase UID 추출 함수 (라우트 공용)
+async def get_firebase_uid(token: HTTPAuthorizationCredentials) -> str:
+    try:
+        return await verify_firebase_token(token.credentials)
+    except Exception as e:
+        print(f"토큰 검증 실패: {e}")
+        raise HTTPException(status_code=401, detail=f"Invalid Firebase token: {str(e)}")
+
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     try:
-        # Firebase가 초기화되었는지 확인
-        if not firebase_admin._apps:
-            print("Firebase Admin SDK가 초기화되지 않았습니다. 재초기화 시도...")
-            initialize_firebase()
-        
-        print(f"토큰 검증 시작: {token[:50]}...")
-        decoded_token = auth.verify_id_token(token)
-        print(f"토큰 검증 성공: UID = {decoded_token.get('uid')}")
-        return User(uid=decoded_token["uid"])
+        return User(uid=await verify_firebase_token(token))
     except Exception as e:
         print(f"토큰 검증 실패: {e}")
         raise HTTPException(
@@ -1,9 +1,11 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.ext.declarative import declarative_base
 import os
+import threading
+import time
 from dotenv import load_dotenv
-from urllib.parse import urlparse
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 load_dotenv()
 
@@ -17,18 +19,179 @@ if not DATABASE_URL:
 if DATABASE_URL.startswith('mysql://') and 'pymysql' not in DATABASE_URL:
     DATABASE_URL = DATABASE_URL.replace('mysql://', 'mysql+pymysql://', 1)
 
-print(f"🔗 데이터베이스 연결: {DATABASE_URL}")
 
-engine = create_engine(DATABASE_URL, echo=True)
-SessionLocal = sessionmaker(bind=engine)
-Base = declarative_base()
+def to_async_url(url: str) -> str:
+    """동기 드라이버 URL을 비동기 드라이버 URL로 변환합니다. (pymysql → aiomysql, sqlite → aiosqlite)"""
+    if url.startswith('mysql+pymysql://'):
+        return url.replace('mysql+pymysql://', 'mysql+aiomysql://', 1)
+    if url.startswith('sqlite://'):
+        return url.replace('sqlite://', 'sqlite+aiosqlite://', 1)
+    return url
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
-def get_db_session():
-    return SessionLocal()
+ASYNC_DATABASE_URL = to_async_url(DATABASE_URL)
+
+# 커넥션 풀 설정 (워커 수 × (DB_POOL_SIZE + DB_MAX_OVERFLOW) 가 MySQL max_connections 를 넘지 않도록 조정)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))  # 커넥션 대기 최대 시간 (초)
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))  # MySQL wait_timeout 보다 짧게 (초)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '10000'))  # SELECT 실행 제한 (0이면 비활성)
+DB_ECHO = os.getenv('DB_ECHO', 'false').lower() == 'true'  # SQL 로그 출력 여부
+
+print(f"🔗 데이터베이스 연결: {make_url(DATABASE_URL).render_as_string(hide_password=True)}")
+
+
+class PoolMetrics:
+    """커넥션 체크아웃 대기 시간 통계 (워커 프로세스 단위)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_total_ms": round(self.total_wait * 1000, 3),
+                "wait_avg_ms": round(self.total_wait * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+                "wait_max_ms": round(self.max_wait * 1000, 3),
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+class _WaitTimingPoolMixin:
+    """풀에서 커넥션을 얻기까지 걸린 시간(대기 + 신규 연결)을 기록합니다."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.record_timeout()
+            raise
+        finally:
+            pool_metrics.record_wait(time.perf_counter() - start)
+
+
+class InstrumentedAsyncQueuePool(_WaitTimingPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def create_db_engine(url: str = DATABASE_URL):
+    """
+    공용 비동기 엔진 팩토리. 풀 크기/재활용/pre-ping/쿼리 타임아웃 설정을 한 곳에서 적용합니다.
+    (마이그레이션 등 동기 스크립트는 쿼리 타임아웃이 걸리지 않도록 각자 create_engine 을 사용)
+
+    Args:
+        url: 동기 드라이버 기준 DB URL (비동기 드라이버로 자동 변환)
+    """
+    engine_url = to_async_url(url)
+    options = {"echo": DB_ECHO}
+
+    if not engine_url.startswith('sqlite'):
+        options.update(
+            poolclass=InstrumentedAsyncQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=True,
+        )
+    if engine_url.startswith('mysql') and DB_STATEMENT_TIMEOUT_MS > 0:
+        # MySQL 5.7.8+: 세션 단위 SELECT 실행 시간 제한
+        options["connect_args"] = {
+            "init_command": f"SET SESSION max_execution_time={DB_STATEMENT_TIMEOUT_MS}"
+        }
+
+    return create_async_engine(engine_url, **options)
+
+
+# 워커당 하나의 공유 엔진/풀
+async_engine = create_db_engine()
+# expire_on_commit=False: 커밋 후 속성 접근 시 지연 로딩(동기 I/O)이 일어나지 않도록 함
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
+
+def get_pool_status() -> dict:
+    """현재 워커의 커넥션 풀 상태를 반환합니다."""
+    pool = async_engine.pool
+    status = {
+        "pid": os.getpid(),
+        "pool_class": type(pool).__name__,
+    }
+    if isinstance(pool, QueuePool):
+        status.update(
+            pool_size=pool.size(),
+            max_overflow=DB_MAX_OVERFLOW,
+            max_connections=pool.size() + DB_MAX_OVERFLOW,
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+        )
+    status.update(pool_metrics.snapshot())
+    return status
+
+
+async def dispose_engine():
+    """애플리케이션 종료 시 풀의 커넥션을 정리합니다."""
+    await async_engine.dispose()
+
+
+_AFTER_COMMIT_HOOKS = "after_commit_hooks"
+
+
+def add_after_commit_hook(db, name: str, hook):
+    """
+    커밋이 확정된 뒤 실행할 비동기 함수를 등록합니다. (같은 name 은 한 번만 등록)
+    요청 단위 세션은 get_async_db 가 커밋 직후 실행하고, 직접 commit 하는 곳은 run_after_commit_hooks 를 호출합니다.
+    """
+    db.info.setdefault(_AFTER_COMMIT_HOOKS, {}).setdefault(name, hook)
+
+
+async def run_after_commit_hooks(db):
+    """등록된 커밋 후 작업을 실행합니다. (이미 커밋된 결과에는 영향이 없으므로 실패는 기록만 함)"""
+    hooks = db.info.pop(_AFTER_COMMIT_HOOKS, {})
+    for name, hook in hooks.items():
+        try:
+            await hook()
+        except Exception as e:
+            print(f"❌ 커밋 후 작업 실패 ({name}): {e}")
+
+
+async def get_async_db():
+    """
+    요청 단위 세션 (Unit of Work).
+    한 요청 안의 서비스 함수들이 같은 세션/커넥션을 공유하고, 정상 종료 시 한 번 커밋하며
+    예외(HTTPException 포함)가 나면 롤백합니다. 서비스 함수는 commit 대신 flush 를 사용합니다.
+    커밋 후 작업(add_after_commit_hook)은 응답을 보내기 전에 실행됩니다.
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+            await db.commit()
+        except BaseException:
+            db.info.pop(_AFTER_COMMIT_HOOKS, None)
+            await db.rollback()
+            raise
+        await run_after_commit_hooks(db)
+
+def get_async_db_session() -> AsyncSession:
+    """`async with get_async_db_session() as db:` 형태로 사용합니다."""
+    return AsyncSessionLocal()
@@ -1,12 +1,35 @@
 import os
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from backend.dependencies.auth import refresh_signing_keys_forever
+from backend.dependencies.db import dispose_engine
+from backend.services.gemini_service import init_gemini_client, close_gemini_client
+from backend.services.image_service import shutdown_image_executor
 from backend.routes.diary_routes import router as diary_router
 from backend.routes.photo_routes import router as photo_router
 from backend.routes.ai_routes import router as ai_router
+from backend.routes.internal_routes import router as internal_router
 
-app = FastAPI(title="My Diary API", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Firebase 토큰 서명 키를 백그라운드에서 미리 받아두고 주기적으로 갱신
+    signing_key_task = asyncio.create_task(refresh_signing_keys_forever())
+    # 앱 전체에서 공유하는 Gemini 클라이언트 생성
+    init_gemini_client()
+    yield
+    await close_gemini_client()
+    signing_key_task.cancel()
+    # 이미지 처리 프로세스 풀 종료
+    shutdown_image_executor()
+    # 종료 시 DB 커넥션 풀 정리
+    await dispose_engine()
+
+
+app = FastAPI(title="My Diary API", version="1.0.0", lifespan=lifespan)
 
 # CORS 설정
 app.add_middleware(
@@ -17,12 +40,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 정적 파일 서빙 설정 (resources 폴더)
+class PhotoStaticFiles(StaticFiles):
+    """사진 파일은 내용이 바뀌지 않으므로(해시/uuid 파일명) 클라이언트가 오래 캐시하도록 합니다."""
+
+    async def get_response(self, path, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code == 200 and path.startswith("photos/"):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+
+# 정적 파일 서빙 설정 (resources 폴더 - 원본 사진과 _128/_512 축소본)
 resources_dir = os.path.join(os.path.dirname(__file__), "resources")
 os.makedirs(resources_dir, exist_ok=True)  # 디렉토리가 없으면 생성
-app.mount("/resources", StaticFiles(directory=resources_dir), name="resources")
+app.mount("/resources", PhotoStaticFiles(directory=resources_dir), name="resources")
 
 # 라우터 등록
 app.include_router(diary_router)  # prefix 제거 (diary_routes.py에서 이미 /diaries 설정됨)
 app.include_router(photo_router)  # prefix 제거 (photo_routes.py에서 이미 /photos 설정됨)
-app.include_router(ai_router, prefix="/ai")
\ No newline at end of file
+app.include_router(ai_router, prefix="/ai")
+app.include_router(internal_router)
\ No newline at end of file
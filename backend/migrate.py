@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+버전별 스키마 마이그레이션 실행 스크립트
+
+사용법 (backend 폴더에서):
+    python migrate.py           # 적용되지 않은 마이그레이션 실행
+    python migrate.py --status  # 적용 현황만 출력
+"""
+
+import os
+import sys
+from dotenv import load_dotenv
+
+# 환경 변수 로드
+load_dotenv()
+
+# DB_URL 확인
+db_url = os.getenv('DB_URL')
+if not db_url:
+    print("❌ DB_URL 환경 변수가 설정되지 않았습니다.")
+    print("📝 .env 파일에 DB_URL을 설정해주세요.")
+    sys.exit(1)
+
+# pymysql 드라이버 확인
+if db_url.startswith('mysql://') and 'pymysql' not in db_url:
+    db_url = db_url.replace('mysql://', 'mysql+pymysql://', 1)
+
+try:
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.engine import make_url
+    from migrations import load_migrations
+
+    print(f"🔗 데이터베이스 연결: {make_url(db_url).render_as_string(hide_password=True)}")
+
+    # 엔진 생성
+    engine = create_engine(db_url)
+
+    # 버전 기록 테이블 생성
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, "
+            "description VARCHAR(255), "
+            "applied_at DATETIME DEFAULT CURRENT_TIMESTAMP)"
+        ))
+        applied = {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+    migrations = load_migrations()
+    pending = [(version, module) for version, module in migrations if version not in applied]
+
+    if '--status' in sys.argv:
+        for version, module in migrations:
+            mark = "✅" if version in applied else "⏳"
+            print(f"{mark} {version:04d} {module.DESCRIPTION}")
+        sys.exit(0)
+
+    if not pending:
+        print("✅ 적용할 마이그레이션이 없습니다.")
+        sys.exit(0)
+
+    # 버전 순서대로 하나씩 적용 (MySQL DDL 은 자동 커밋되므로 단계별로 기록)
+    for version, module in pending:
+        print(f"📋 {version:04d} 적용 중: {module.DESCRIPTION}")
+        with engine.begin() as conn:
+            module.upgrade(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, description) VALUES (:version, :description)"),
+                {"version": version, "description": module.DESCRIPTION[:255]}
+            )
+        print(f"✅ {version:04d} 적용 완료")
+
+    print(f"✅ 마이그레이션 {len(pending)}개가 성공적으로 적용되었습니다!")
+
+except ImportError as e:
+    print(f"❌ 모듈 import 오류: {e}")
+    print("📦 필요한 패키지를 설치해주세요: pip install sqlalchemy pymysql")
+    sys.exit(1)
+except Exception as e:
+    print(f"❌ 마이그레이션 실패: {e}")
+    sys.exit(1)
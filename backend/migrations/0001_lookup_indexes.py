@@ -0,0 +1,22 @@
+"""조회용 복합 인덱스와 (user_id, date) 유니크 제약 추가"""
+
+from sqlalchemy import text
+from migrations import add_index
+
+DESCRIPTION = "DiaryEntry(user_id, date) 유니크, Photo(diary_id, id), AIQueryLog(diary_id, created_at) 인덱스"
+
+
+def upgrade(conn):
+    # 유니크 제약 전에 중복 일기가 있는지 확인 (있으면 수동 정리 필요)
+    duplicates = conn.execute(text(
+        "SELECT user_id, date, COUNT(*) AS cnt FROM DiaryEntry "
+        "GROUP BY user_id, date HAVING COUNT(*) > 1"
+    )).fetchall()
+    if duplicates:
+        for row in duplicates:
+            print(f"  ⚠️ 중복 일기: user_id={row.user_id}, date={row.date}, {row.cnt}개")
+        raise RuntimeError("같은 날짜의 중복 일기를 정리한 뒤 다시 실행해주세요.")
+
+    add_index(conn, "DiaryEntry", "uq_diaryentry_user_date", ["user_id", "date"], unique=True)
+    add_index(conn, "Photo", "ix_photo_diary_id_id", ["diary_id", "id"])
+    add_index(conn, "AIQueryLog", "ix_aiquerylog_diary_created", ["diary_id", "created_at"])
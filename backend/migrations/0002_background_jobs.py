@@ -0,0 +1,39 @@
+"""BackgroundJob 작업 큐 테이블과 Photo.description_status 추가"""
+
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Enum, Index, Integer, MetaData, String, Table, Text
+from migrations import add_column, table_exists
+
+DESCRIPTION = "BackgroundJob 테이블, Photo.description_status 컬럼"
+
+metadata = MetaData()
+
+background_job = Table(
+    "BackgroundJob",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("kind", String(50), nullable=False),
+    Column("target_id", Integer, nullable=False),
+    Column("status", Enum("pending", "running", "done", "failed", name="job_status_enum"), nullable=False, default="pending"),
+    Column("attempts", Integer, nullable=False, default=0),
+    Column("max_attempts", Integer, nullable=False, default=5),
+    Column("last_error", Text),
+    Column("run_after", DateTime, nullable=False, default=datetime.utcnow),
+    Column("locked_at", DateTime),
+    Column("created_at", DateTime, default=datetime.utcnow),
+    Column("updated_at", DateTime, default=datetime.utcnow),
+    Index("ix_backgroundjob_status_run_after", "status", "run_after"),
+    Index("ix_backgroundjob_kind_target", "kind", "target_id"),
+)
+
+
+def upgrade(conn):
+    if not table_exists(conn, "BackgroundJob"):
+        background_job.create(conn)
+        print("  ↳ 테이블 BackgroundJob 생성 완료")
+
+    if conn.dialect.name == "mysql":
+        ddl = "ENUM('pending','done','failed') NOT NULL DEFAULT 'done'"
+    else:
+        ddl = "VARCHAR(7) NOT NULL DEFAULT 'done'"
+    add_column(conn, "Photo", "description_status", ddl)
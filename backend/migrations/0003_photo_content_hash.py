@@ -0,0 +1,10 @@
+"""Photo.content_hash 컬럼과 인덱스 추가 (내용 기반 사진 저장)"""
+
+from migrations import add_column, add_index
+
+DESCRIPTION = "Photo.content_hash 컬럼, Photo(content_hash) 인덱스"
+
+
+def upgrade(conn):
+    add_column(conn, "Photo", "content_hash", "VARCHAR(64) NULL")
+    add_index(conn, "Photo", "ix_photo_content_hash", ["content_hash"])
@@ -0,0 +1,10 @@
+"""Photo 축소본(128px/512px) URL 컬럼 추가"""
+
+from migrations import add_column
+
+DESCRIPTION = "Photo.thumbnail_path, Photo.preview_path 컬럼"
+
+
+def upgrade(conn):
+    add_column(conn, "Photo", "thumbnail_path", "VARCHAR(255) NULL")
+    add_column(conn, "Photo", "preview_path", "VARCHAR(255) NULL")
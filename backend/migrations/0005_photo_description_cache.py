@@ -0,0 +1,26 @@
+"""정규화된 이미지 해시별 사진 설명 캐시 테이블 추가"""
+
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, Text
+from migrations import table_exists
+
+DESCRIPTION = "PhotoDescriptionCache 테이블"
+
+metadata = MetaData()
+
+photo_description_cache = Table(
+    "PhotoDescriptionCache",
+    metadata,
+    Column("image_hash", String(64), primary_key=True),
+    Column("description", Text, nullable=False),
+    Column("hit_count", Integer, nullable=False, default=0),
+    Column("created_at", DateTime, default=datetime.utcnow),
+    Column("last_used_at", DateTime, nullable=False, default=datetime.utcnow),
+    Index("ix_photodescriptioncache_last_used", "last_used_at"),
+)
+
+
+def upgrade(conn):
+    if not table_exists(conn, "PhotoDescriptionCache"):
+        photo_description_cache.create(conn)
+        print("  ↳ 테이블 PhotoDescriptionCache 생성 완료")
@@ -0,0 +1,9 @@
+"""첫 AI 질문 생성 중복 방지용 DiaryEntry.opening_claimed_at 컬럼 추가"""
+
+from migrations import add_column
+
+DESCRIPTION = "DiaryEntry.opening_claimed_at 컬럼"
+
+
+def upgrade(conn):
+    add_column(conn, "DiaryEntry", "opening_claimed_at", "DATETIME NULL")
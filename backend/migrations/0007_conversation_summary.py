@@ -0,0 +1,24 @@
+"""일기별 AI 대화 요약 테이블 추가"""
+
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table, Text
+from migrations import table_exists
+
+DESCRIPTION = "ConversationSummary 테이블"
+
+metadata = MetaData()
+
+conversation_summary = Table(
+    "ConversationSummary",
+    metadata,
+    Column("diary_id", Integer, primary_key=True, autoincrement=False),
+    Column("summary", Text, nullable=False),
+    Column("summarized_until_id", Integer, nullable=False, default=0),
+    Column("updated_at", DateTime, default=datetime.utcnow),
+)
+
+
+def upgrade(conn):
+    if not table_exists(conn, "ConversationSummary"):
+        conversation_summary.create(conn)
+        print("  ↳ 테이블 ConversationSummary 생성 완료")
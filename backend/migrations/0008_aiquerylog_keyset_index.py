@@ -0,0 +1,9 @@
+"""대화 로그 keyset 페이지 조회용 AIQueryLog(diary_id, id) 인덱스 추가"""
+
+from migrations import add_index
+
+DESCRIPTION = "AIQueryLog(diary_id, id) 인덱스"
+
+
+def upgrade(conn):
+    add_index(conn, "AIQueryLog", "ix_aiquerylog_diary_id_id", ["diary_id", "id"])
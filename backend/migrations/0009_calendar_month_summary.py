@@ -0,0 +1,24 @@
+"""사용자별 월 달력 캐시 테이블 추가"""
+
+from datetime import datetime
+from sqlalchemy import Column, DateTime, MetaData, String, Table, Text
+from migrations import table_exists
+
+DESCRIPTION = "CalendarMonthSummary 테이블"
+
+metadata = MetaData()
+
+calendar_month_summary = Table(
+    "CalendarMonthSummary",
+    metadata,
+    Column("user_id", String(128), primary_key=True),
+    Column("year_month", String(7), primary_key=True),
+    Column("days", Text, nullable=False),
+    Column("updated_at", DateTime, default=datetime.utcnow),
+)
+
+
+def upgrade(conn):
+    if not table_exists(conn, "CalendarMonthSummary"):
+        calendar_month_summary.create(conn)
+        print("  ↳ 테이블 CalendarMonthSummary 생성 완료")
@@ -0,0 +1,22 @@
+"""축소본이 없는 기존 사진의 축소본 생성 작업 등록 (워커가 처리)"""
+
+from datetime import datetime
+from sqlalchemy import text
+
+DESCRIPTION = "기존 사진 128/512px 축소본 생성 작업 등록"
+
+# backend/services/photo_service.py 의 PHOTO_DERIVATIVES_JOB
+PHOTO_DERIVATIVES_JOB = "photo_derivatives"
+
+
+def upgrade(conn):
+    now = datetime.utcnow()
+    result = conn.execute(
+        text(
+            "INSERT INTO BackgroundJob (kind, target_id, status, attempts, max_attempts, run_after, created_at, updated_at) "
+            "SELECT :kind, id, 'pending', 0, 5, :now, :now, :now FROM Photo "
+            "WHERE thumbnail_path IS NULL AND path IS NOT NULL"
+        ),
+        {"kind": PHOTO_DERIVATIVES_JOB, "now": now},
+    )
+    print(f"  ↳ 축소본 생성 작업 {result.rowcount}개 등록 (python -m backend.worker 가 처리)")
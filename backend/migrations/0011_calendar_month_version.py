@@ -0,0 +1,9 @@
+"""월 달력 캐시에 버전 컬럼 추가 (커밋 후 무효화 + 버전 비교 저장)"""
+
+from migrations import add_column
+
+DESCRIPTION = "CalendarMonthSummary.version 컬럼"
+
+
+def upgrade(conn):
+    add_column(conn, "CalendarMonthSummary", "version", "INTEGER NOT NULL DEFAULT 0")
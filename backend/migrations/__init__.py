@@ -0,0 +1,75 @@
+"""
+버전별 스키마 마이그레이션
+
+각 마이그레이션은 이 폴더의 `NNNN_설명.py` 모듈이며 다음을 정의합니다.
+- DESCRIPTION: 설명 문자열
+- upgrade(conn): 동기 SQLAlchemy Connection 을 받아 스키마를 변경
+
+적용 여부는 schema_migrations 테이블에 기록되며, `python migrate.py` 로 실행합니다.
+create_all 로 이미 만들어진 DB 에서도 안전하도록 각 단계는 존재 여부를 먼저 확인합니다.
+"""
+
+import importlib
+import os
+import re
+from sqlalchemy import inspect, text
+
+_MODULE_PATTERN = re.compile(r"^(\d{4})_\w+\.py$")
+
+
+def load_migrations():
+    """(version, module) 목록을 버전 순으로 반환합니다."""
+    migrations = []
+    for filename in sorted(os.listdir(os.path.dirname(__file__))):
+        match = _MODULE_PATTERN.match(filename)
+        if match:
+            module = importlib.import_module(f"{__name__}.{filename[:-3]}")
+            migrations.append((int(match.group(1)), module))
+    return migrations
+
+
+def index_exists(conn, table: str, name: str) -> bool:
+    inspector = inspect(conn)
+    indexes = inspector.get_indexes(table) + inspector.get_unique_constraints(table)
+    return any(index["name"] == name for index in indexes)
+
+
+def column_exists(conn, table: str, column: str) -> bool:
+    return any(col["name"] == column for col in inspect(conn).get_columns(table))
+
+
+def table_exists(conn, table: str) -> bool:
+    return inspect(conn).has_table(table)
+
+
+def add_index(conn, table: str, name: str, columns: list, unique: bool = False):
+    """
+    인덱스를 추가합니다. MySQL 에서는 온라인 DDL(ALGORITHM=INPLACE, LOCK=NONE)로
+    테이블 잠금 없이 생성합니다.
+    """
+    if index_exists(conn, table, name):
+        print(f"  ↳ 인덱스 {table}.{name} 이미 존재 - 건너뜀")
+        return
+
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    column_list = ", ".join(f"`{col}`" if conn.dialect.name == "mysql" else f'"{col}"' for col in columns)
+    if conn.dialect.name == "mysql":
+        conn.execute(text(
+            f"ALTER TABLE `{table}` ADD {kind} `{name}` ({column_list}), ALGORITHM=INPLACE, LOCK=NONE"
+        ))
+    else:
+        conn.execute(text(f'CREATE {kind} "{name}" ON "{table}" ({column_list})'))
+    print(f"  ↳ 인덱스 {table}.{name} 생성 완료")
+
+
+def add_column(conn, table: str, column: str, ddl: str):
+    """컬럼을 추가합니다. ddl 은 `VARCHAR(64) NULL` 처럼 타입/옵션 부분입니다."""
+    if column_exists(conn, table, column):
+        print(f"  ↳ 컬럼 {table}.{column} 이미 존재 - 건너뜀")
+        return
+
+    if conn.dialect.name == "mysql":
+        conn.execute(text(f"ALTER TABLE `{table}` ADD COLUMN `{column}` {ddl}, ALGORITHM=INPLACE, LOCK=NONE"))
+    else:
+        conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN "{column}" {ddl}'))
+    print(f"  ↳ 컬럼 {table}.{column} 추가 완료")
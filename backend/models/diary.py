@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Date, DateTime, Enum, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, Enum, Float, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime
 
@@ -6,12 +6,18 @@ Base = declarative_base()
 
 class DiaryEntry(Base):
     __tablename__ = "DiaryEntry"
+    __table_args__ = (
+        # 사용자당 하루 한 개의 일기 + (user_id, date) 조회/월별 범위 조회용 인덱스
+        UniqueConstraint("user_id", "date", name="uq_diaryentry_user_date"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(String(128), nullable=False)
     date = Column(Date)
     content = Column(Text)
     mood = Column(String(100))
+    # 첫 AI 질문 생성을 맡은 시각 (여러 요청/프로세스가 동시에 생성하지 않도록 하는 표시)
+    opening_claimed_at = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -24,11 +30,29 @@ class DiaryEntry(Base):
 
 class Photo(Base):
     __tablename__ = "Photo"
+    __table_args__ = (
+        # 일기별 사진 조회 및 첫 번째 사진(썸네일) 조회용
+        Index("ix_photo_diary_id_id", "diary_id", "id"),
+        # 같은 내용의 사진 조회 (파일 중복 제거 / 참조 수 계산)
+        Index("ix_photo_content_hash", "content_hash"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     diary_id = Column(Integer, ForeignKey("DiaryEntry.id"))
     path = Column(String(255))
+    # 파일 내용의 SHA-256 (같은 내용이면 같은 파일을 공유, 기존 사진은 NULL)
+    content_hash = Column(String(64))
+    # 업로드 시 생성한 축소본 URL (128px 달력용 / 512px 상세용, 기존 사진은 NULL)
+    thumbnail_path = Column(String(255))
+    preview_path = Column(String(255))
     description = Column(Text)
+    # 사진 설명 생성 상태 (업로드 직후 pending → 워커가 done/failed 로 갱신)
+    description_status = Column(
+        Enum("pending", "done", "failed", name="description_status_enum"),
+        nullable=False,
+        default="done",
+        server_default="done"
+    )
     created_at = Column(DateTime, default=datetime.utcnow)
 
     diary = relationship("DiaryEntry", back_populates="photos")
@@ -44,6 +68,12 @@ class Photo(Base):
 
 class AIQueryLog(Base):
     __tablename__ = "AIQueryLog"
+    __table_args__ = (
+        # 일기별 대화 내역을 시간순으로 조회
+        Index("ix_aiquerylog_diary_created", "diary_id", "created_at"),
+        # 대화 로그 keyset 페이지 조회 (diary_id, id < before_id 역순)
+        Index("ix_aiquerylog_diary_id_id", "diary_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     diary_id = Column(Integer, ForeignKey("DiaryEntry.id"))
@@ -56,3 +86,68 @@ class AIQueryLog(Base):
         "from_attributes": True  # ✅ Pydantic v2 호환
     }
 
+
+class BackgroundJob(Base):
+    """워커 프로세스가 처리하는 영속 작업 큐 (예: Gemini 사진 설명 생성)"""
+    __tablename__ = "BackgroundJob"
+    __table_args__ = (
+        # 워커의 다음 작업 조회 (status, run_after 순)
+        Index("ix_backgroundjob_status_run_after", "status", "run_after"),
+        Index("ix_backgroundjob_kind_target", "kind", "target_id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String(50), nullable=False)
+    target_id = Column(Integer, nullable=False)
+    status = Column(
+        Enum("pending", "running", "done", "failed", name="job_status_enum"),
+        nullable=False,
+        default="pending"
+    )
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    last_error = Column(Text)
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ConversationSummary(Base):
+    """일기별 AI 대화 요약 (오래된 대화를 접어 프롬프트 크기를 일정하게 유지)"""
+    __tablename__ = "ConversationSummary"
+
+    diary_id = Column(Integer, primary_key=True, autoincrement=False)
+    summary = Column(Text, nullable=False, default="")
+    # 요약에 반영된 마지막 AIQueryLog.id (이후 메시지만 원문으로 사용)
+    summarized_until_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class CalendarMonthSummary(Base):
+    """사용자별 월 달력 결과 캐시 (일기/첫 사진이 바뀌면 커밋 후 해당 월 행을 무효화)"""
+    __tablename__ = "CalendarMonthSummary"
+
+    user_id = Column(String(128), primary_key=True)
+    year_month = Column(String(7), primary_key=True)  # YYYY-MM
+    # GET /diaries/month/{year_month} 의 days 목록 (JSON, 무효화되면 빈 문자열)
+    days = Column(Text, nullable=False)
+    # 무효화할 때마다 증가 (저장은 조회 시점의 버전이 그대로일 때만)
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class PhotoDescriptionCache(Base):
+    """정규화된 이미지(Gemini 전송용 압축본)의 해시별 사진 설명 캐시"""
+    __tablename__ = "PhotoDescriptionCache"
+    __table_args__ = (
+        # 개수 제한을 넘으면 가장 오래 쓰지 않은 항목부터 삭제
+        Index("ix_photodescriptioncache_last_used", "last_used_at"),
+    )
+
+    # compress_image_for_gemini 결과 바이트의 SHA-256
+    image_hash = Column(String(64), primary_key=True)
+    description = Column(Text, nullable=False)
+    hit_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -1,8 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 
-from backend.services.ai_service import fetch_ai_logs, generate_contextual_ai_conversation
-from backend.dependencies.db import get_db, get_db_session
-from typing import Annotated
+from backend.services.ai_service import (
+    fetch_ai_logs,
+    generate_contextual_ai_conversation,
+    stream_contextual_ai_conversation,
+    get_or_create_opening_chats,
+    AI_LOG_PAGE_SIZE,
+    AI_LOG_MAX_PAGE_SIZE
+)
+from backend.dependencies.db import get_async_db_session
+from typing import Optional
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/ai_logs", tags=["AI Logs"])
@@ -15,67 +25,34 @@ class ChatMessage(BaseModel):
 @router.get("/{diary_id}")
 async def get_ai_logs_route(
     diary_id: int,
-    db: Annotated[object, Depends(get_db)],
+    before_id: Optional[int] = Query(None, description="이 id 보다 오래된 메시지를 조회 (이전 응답의 next_before_id)"),
+    limit: Optional[int] = Query(None, ge=1, le=AI_LOG_MAX_PAGE_SIZE, description=f"페이지 크기 (before_id 만 주면 {AI_LOG_PAGE_SIZE})"),
     # user_id: int = Depends(get_current_user)
 ):
     """
-    특정 일기의 AI 대화 로그를 조회합니다.
+    특정 일기의 AI 대화 로그를 조회합니다. (시간순)
     대화 내역이 없으면 초기 AI 메시지를 자동 생성합니다.
+    - limit, before_id 를 모두 생략하면 전체 대화를 반환합니다. (기존 앱 호환)
+    - limit 를 주면 최근 것부터 limit 개씩 페이지로 조회하며, has_more 가 true 이면 next_before_id 로 더 오래된 메시지를 이어서 조회합니다.
     """
-    logs = fetch_ai_logs(diary_id, db)
+    if limit is None and before_id is not None:
+        limit = AI_LOG_PAGE_SIZE
+    # 요청 단위 세션 대신 짧은 세션으로 조회하고 바로 반납 (첫 질문 생성 중 Gemini 응답을 기다리는 동안 커넥션을 잡지 않도록)
+    async with get_async_db_session() as db:
+        chats, has_more = await fetch_ai_logs(diary_id, db, before_id=before_id, limit=limit)
     
-    # logs를 chats 형태로 변환
-    chats = []
-    for log in logs:
-        chats.append({
-            "by": log["written_by"],
-            "text": log["content"]
-        })
-    
-    # 대화 내역이 없으면 초기 AI 메시지 생성
-    if not chats:
-        from backend.services.ai_service import generate_ai_response_logic
-        from backend.models.diary import DiaryEntry, Photo, AIQueryLog
-        
-        # 일기 정보 가져오기
-        db_session = get_db_session()
+    # 대화 내역이 없으면 초기 AI 메시지 생성 (동시 요청은 한 번의 생성을 공유)
+    if not chats and before_id is None:
         try:
-            diary = db_session.query(DiaryEntry).filter(DiaryEntry.id == diary_id).first()
-            if diary:
-                # 사진 설명들 가져오기
-                photos = db_session.query(Photo).filter(Photo.diary_id == diary_id).all()
-                photo_descriptions = [photo.description for photo in photos if photo.description]
-                
-                # 첫 번째 질문 생성 (사진 설명 기반)
-                first_question, _, _ = generate_ai_response_logic(
-                    diary, photo_descriptions, [], ""
-                )
-                
-                # 초기 AI 메시지들을 DB에 저장
-                initial_message = AIQueryLog(
-                    diary_id=diary_id,
-                    content="일기를 생성하는거 도와줄게. 질문에 대답해줘",
-                    written_by="ai"
-                )
-                db_session.add(initial_message)
-                
-                first_question_log = AIQueryLog(
-                    diary_id=diary_id,
-                    content=first_question,
-                    written_by="ai"
-                )
-                db_session.add(first_question_log)
-                
-                db_session.commit()
-                
-                chats = [
-                    {"by": "ai", "text": "일기를 생성하는거 도와줄게. 질문에 대답해줘"},
-                    {"by": "ai", "text": first_question}
-                ]
-        finally:
-            db_session.close()
+            chats = await get_or_create_opening_chats(diary_id)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="AI 응답 시간이 초과되었습니다.")
     
-    return {"chats": chats}
+    return {
+        "chats": chats,
+        "has_more": has_more,
+        "next_before_id": chats[0]["id"] if has_more else None
+    }
 
 
 # 사용자 대화 업로드 및 AI 응답
@@ -83,17 +60,46 @@ async def get_ai_logs_route(
 async def upload_user_message(
     diary_id: int,
     chat_input: ChatMessage,
-    db: Annotated[object, Depends(get_db)],
+    only_new: bool = Query(False, description="true 이면 이번 사용자 메시지와 AI 응답만 반환"),
     # user_id: int = Depends(get_current_user)
 ):
     """
     사용자 메시지를 업로드하고 AI 응답을 생성합니다.
     - diary_id: 일기 ID
     - message: 사용자 메시지
+    - only_new: true 이면 chats 에 새 메시지 2개만 담음 (긴 대화에서 응답 크기 일정)
     - 반환: 대화 히스토리와 AI 응답
+    
+    요청 단위 세션을 쓰지 않습니다. (Gemini 응답을 기다리는 동안 DB 커넥션을 잡지 않도록 서비스가 짧게 나눠 사용)
     """
     try:
-        result = generate_contextual_ai_conversation(diary_id, chat_input.message)
+        result = await generate_contextual_ai_conversation(diary_id, chat_input.message, only_new=only_new)
         return result
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"AI 대화 생성 실패: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"AI 대화 생성 실패: {str(e)}")
+
+
+# 사용자 대화 업로드 및 AI 응답 스트리밍 (Server-Sent Events)
+@router.post("/{diary_id}/stream")
+async def stream_user_message(
+    diary_id: int,
+    chat_input: ChatMessage,
+    # user_id: int = Depends(get_current_user)
+):
+    """
+    사용자 메시지를 업로드하고 AI 응답을 생성되는 대로 SSE 로 전송합니다.
+    - event: delta → {"text": 이어붙일 answer 조각}
+    - event: done  → {"answer", "is_edit_text", "edited_text"(수정 요청일 때)}
+    - event: error → {"error": 메시지}
+    스트림이 끝나면 AI 응답이 대화 로그에 저장됩니다.
+    """
+    async def event_stream():
+        # 스트리밍 응답은 의존성 정리 이후에 전송되므로 세션은 서비스 안에서 직접 엽니다
+        async for event, data in stream_contextual_ai_conversation(diary_id, chat_input.message):
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,47 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials
 from datetime import datetime, date
 from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 
-import firebase_admin
-from firebase_admin import auth
+from backend.dependencies.auth import auth_scheme, get_firebase_uid
+from backend.dependencies.db import get_async_db
 
 from backend.schemas.diary import DiaryEntryCreate, DiaryUpdateSchema, DiaryEntry
 from backend.services.diary_service import (
     create_diary_entry,
     get_diary_entry,
     diary_exists_by_date,
-    get_diary_days_in_month,
+    get_diary_id_by_date,
+    get_calendar_month,
+    get_diary_days_in_range,
     update_diary_content,
-    delete_diary
+    delete_diary,
+    DiaryAlreadyExistsError
 )
-from backend.services.photo_service import upload_photo_with_description
+from backend.services.photo_service import upload_photos_concurrently
+from backend.services.ai_service import schedule_opening_question
+from backend.services.export_service import stream_ndjson_export, stream_zip_export
 
 router = APIRouter(prefix="/diaries", tags=["Diary"])
-auth_scheme = HTTPBearer()
-
-# Firebase Admin SDK 초기화 확인
-def ensure_firebase_initialized():
-    """Firebase Admin SDK가 초기화되었는지 확인하고, 필요시 초기화합니다."""
-    if not firebase_admin._apps:
-        print("Firebase Admin SDK가 초기화되지 않았습니다. 초기화 시도...")
-        from backend.dependencies.auth import initialize_firebase
-        initialize_firebase()
-
-# ✅ Firebase UID 추출 함수 (중복 제거용)
-def get_firebase_uid(token: HTTPAuthorizationCredentials) -> str:
-    try:
-        # Firebase 초기화 확인
-        ensure_firebase_initialized()
-        
-        print(f"토큰 검증 시작 (diary_routes): {token.credentials[:50]}...")
-        decoded_token = auth.verify_id_token(token.credentials)
-        uid = decoded_token.get("uid")
-        print(f"토큰 검증 성공 (diary_routes): UID = {uid}")
-        return uid
-    except Exception as e:
-        print(f"토큰 검증 실패 (diary_routes): {e}")
-        raise HTTPException(status_code=401, detail=f"Invalid Firebase token: {str(e)}")
 
 # ✅ 일기 생성 (사진 포함)
 @router.post("/")
@@ -50,23 +33,24 @@ async def create_diary(
     mood: str = Form(...),  # 필수, 기분 이모지
     content: Optional[str] = Form(""),  # 선택사항, 기본값 빈 문자열
     photos: Optional[List[UploadFile]] = File(None),
-    token: HTTPAuthorizationCredentials = Depends(auth_scheme)
+    token: HTTPAuthorizationCredentials = Depends(auth_scheme),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     일기와 사진을 함께 생성합니다.
     - date: YYYY-MM-DD 형식 (예: 2024-01-15) - 필수
     - mood: 기분 이모지 - 필수 (예: 😊, 😄, 😔)
     - content: 일기 내용 - 선택사항 (나중에 추가 가능)
-    - photos: 업로드할 사진들 (선택사항, Gemini API로 자동 설명 생성)
+    - photos: 업로드할 사진들 (선택사항, Gemini API 설명은 워커가 비동기로 생성)
     """
     try:
-        uid = get_firebase_uid(token)
+        uid = await get_firebase_uid(token)
         
         # date 문자열을 date 객체로 변환
         diary_date = datetime.strptime(date, "%Y-%m-%d").date()
         
         # 해당 날짜에 이미 일기가 있는지 확인
-        if diary_exists_by_date(diary_date, uid):
+        if await diary_exists_by_date(diary_date, uid, db):
             raise HTTPException(
                 status_code=409, 
                 detail=f"{date} 날짜에 이미 일기가 존재합니다. 다른 날짜를 선택하거나 기존 일기를 수정해주세요."
@@ -76,31 +60,34 @@ async def create_diary(
         diary_content = content if content is not None else ""
         
         # 일기 생성
-        diary_id = create_diary_entry(
+        diary_id = await create_diary_entry(
             date=diary_date,
             user_id=uid,
             content=diary_content,
-            mood=mood
+            mood=mood,
+            db=db
         )
         
         # 사진 업로드 처리
         uploaded_photos = []
         if photos:
-            for photo in photos:
-                try:
-                    photo_id, photo_url, photo_description = await upload_photo_with_description(
-                        diary_id=diary_id,
-                        photo=photo,
-                        db=None
-                    )
-                    uploaded_photos.append({
-                        "photo_id": photo_id,
-                        "photo_url": photo_url,
-                        "photo_description": photo_description
-                    })
-                except Exception as e:
-                    print(f"사진 업로드 실패: {e}")
+            # 여러 장을 제한된 동시성으로 처리 (결과는 업로드 순서 유지)
+            results = await upload_photos_concurrently(diary_id=diary_id, photos=photos, db=db)
+            for result in results:
+                if isinstance(result, Exception):
+                    print(f"사진 업로드 실패: {result}")
                     # 사진 업로드 실패해도 일기는 생성됨
+                    continue
+                photo_id, photo_url, photo_description, description_status = result
+                uploaded_photos.append({
+                    "photo_id": photo_id,
+                    "photo_url": photo_url,
+                    "photo_description": photo_description,
+                    "description_status": description_status
+                })
+        
+        # 첫 AI 질문 미리 생성 (설정된 경우, 사진 설명이 끝난 뒤 워커가 처리)
+        schedule_opening_question(diary_id, db)
         
         return {
             "diary_id": diary_id,
@@ -115,6 +102,11 @@ async def create_diary(
     except HTTPException:
         # HTTPException은 그대로 재발생
         raise
+    except DiaryAlreadyExistsError:
+        raise HTTPException(
+            status_code=409,
+            detail=f"{date} 날짜에 이미 일기가 존재합니다. 다른 날짜를 선택하거나 기존 일기를 수정해주세요."
+        )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"날짜 형식 오류: {str(e)}")
     except Exception as e:
@@ -126,7 +118,8 @@ async def create_text_diary(
     date: str = Form(...),  # YYYY-MM-DD 형식
     mood: str = Form(...),  # 필수, 기분 이모지
     content: Optional[str] = Form(""),  # 선택사항, 기본값 빈 문자열
-    token: HTTPAuthorizationCredentials = Depends(auth_scheme)
+    token: HTTPAuthorizationCredentials = Depends(auth_scheme),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     사진 없이 텍스트 일기만 생성합니다.
@@ -135,13 +128,13 @@ async def create_text_diary(
     - content: 일기 내용 - 선택사항 (나중에 추가 가능)
     """
     try:
-        uid = get_firebase_uid(token)
+        uid = await get_firebase_uid(token)
         
         # date 문자열을 date 객체로 변환
         diary_date = datetime.strptime(date, "%Y-%m-%d").date()
         
         # 해당 날짜에 이미 일기가 있는지 확인
-        if diary_exists_by_date(diary_date, uid):
+        if await diary_exists_by_date(diary_date, uid, db):
             raise HTTPException(
                 status_code=409, 
                 detail=f"{date} 날짜에 이미 일기가 존재합니다. 다른 날짜를 선택하거나 기존 일기를 수정해주세요."
@@ -151,13 +144,17 @@ async def create_text_diary(
         diary_content = content if content is not None else ""
         
         # 일기 생성
-        diary_id = create_diary_entry(
+        diary_id = await create_diary_entry(
             date=diary_date,
             user_id=uid,
             content=diary_content,
-            mood=mood
+            mood=mood,
+            db=db
         )
         
+        # 첫 AI 질문 미리 생성 (설정된 경우)
+        schedule_opening_question(diary_id, db)
+        
         return {
             "diary_id": diary_id,
             "date": date,
@@ -171,60 +168,122 @@ async def create_text_diary(
     except HTTPException:
         # HTTPException은 그대로 재발생
         raise
+    except DiaryAlreadyExistsError:
+        raise HTTPException(
+            status_code=409,
+            detail=f"{date} 날짜에 이미 일기가 존재합니다. 다른 날짜를 선택하거나 기존 일기를 수정해주세요."
+        )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"날짜 형식 오류: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"일기 생성 실패: {str(e)}")
 
+# YYYY-MM 문자열을 (year, month) 로 변환
+def parse_year_month(year_month: str):
+    year, month = map(int, year_month.split('-'))
+    if not 1 <= month <= 12:
+        raise ValueError(f"잘못된 월: {month}")
+    return year, month
+
+# ✅ 여러 달 달력 (/{diary_id} 보다 먼저 선언해야 함)
+@router.get("/calendar")
+async def diary_days_by_range(
+    from_month: str = Query(..., alias="from"),
+    to_month: str = Query(..., alias="to"),
+    format: str = Query("days", pattern="^(days|bitmap)$"),
+    token: HTTPAuthorizationCredentials = Depends(auth_scheme),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    여러 달의 일기 존재 여부를 한 번에 확인합니다. (연간 보기/무한 스크롤 달력용)
+    - from, to: YYYY-MM 형식, 양 끝 포함 (예: /diaries/calendar?from=2025-01&to=2025-12)
+    - format: days(기본, 월별 엔드포인트와 같은 날짜별 목록) / bitmap(일기가 있는 날을 비트로 표시, 1일 = 최하위 비트)
+    """
+    try:
+        start = parse_year_month(from_month)
+        end = parse_year_month(to_month)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid month format. Use YYYY-MM")
+    uid = await get_firebase_uid(token)
+    try:
+        months = await get_diary_days_in_range(start, end, uid, db, bitmap=format == "bitmap")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"months": months}
+
+# ✅ 내 데이터 내보내기 (/{diary_id} 보다 먼저 선언해야 함)
+@router.get("/export")
+async def export_diaries(
+    format: str = Query("ndjson", pattern="^(ndjson|zip)$"),
+    token: HTTPAuthorizationCredentials = Depends(auth_scheme)
+):
+    """
+    사용자의 모든 일기, 사진 정보, AI 대화를 스트리밍으로 내보냅니다.
+    - format=ndjson: 한 줄에 레코드 하나 (type: diary / photo / ai_log)
+    - format=zip: diary_export.ndjson + photos/ 아래 사진 원본 파일
+    기간이 길어도 keyset 배치(배치마다 짧은 세션)로 나눠 읽고 청크 단위로 전송하므로 메모리 사용량이 일정합니다.
+    """
+    uid = await get_firebase_uid(token)
+    filename = f"my_diary_export_{date.today():%Y%m%d}"
+    # 스트리밍 응답은 의존성 정리 이후에 전송되므로 세션은 서비스 안에서 직접 엽니다
+    if format == "zip":
+        return StreamingResponse(
+            stream_zip_export(uid),
+            media_type="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.zip"'}
+        )
+    return StreamingResponse(
+        stream_ndjson_export(uid),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}.ndjson"'}
+    )
+
 # ✅ 일기 불러오기
 @router.get("/{diary_id}", response_model=DiaryEntry)
-def read_diary(
+async def read_diary(
     diary_id: int,
-    token: HTTPAuthorizationCredentials = Depends(auth_scheme)
+    token: HTTPAuthorizationCredentials = Depends(auth_scheme),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    uid = get_firebase_uid(token)
-    diary = get_diary_entry(diary_id)
+    uid = await get_firebase_uid(token)
+    diary = await get_diary_entry(diary_id, db, uid)
     if not diary:
         raise HTTPException(status_code=404, detail="Diary not found")
     return diary
 
 # ✅ 날짜 기반 일기 유무 확인
 @router.get("/date/{target_date}")
-def check_diary_exists(
+async def check_diary_exists(
     target_date: date,
-    token: HTTPAuthorizationCredentials = Depends(auth_scheme)
+    token: HTTPAuthorizationCredentials = Depends(auth_scheme),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    uid = get_firebase_uid(token)
-    exists = diary_exists_by_date(target_date, uid)
+    uid = await get_firebase_uid(token)
     
-    # 일기가 존재하면 diary_id도 함께 반환
-    diary_id = None
-    if exists:
-        # 해당 날짜의 일기 ID 조회
-        from backend.services.diary_service import get_diary_by_date
-        diary = get_diary_by_date(target_date, uid)
-        if diary:
-            diary_id = diary.id
+    # 일기가 존재하면 diary_id도 함께 반환 (ID 조회 한 번으로 확인)
+    diary_id = await get_diary_id_by_date(target_date, uid, db)
     
     return {
-        "exists": exists,
+        "exists": diary_id is not None,
         "diary_id": diary_id
     }
 
 # ✅ 월별 일기 존재 여부
 @router.get("/month/{year_month}")
-def diary_days_by_month(
+async def diary_days_by_month(
     year_month: str,
-    token: HTTPAuthorizationCredentials = Depends(auth_scheme)
+    token: HTTPAuthorizationCredentials = Depends(auth_scheme),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     특정 월의 일기 존재 여부를 확인합니다.
     year_month: YYYY-MM 형식 (예: 2024-01)
+    결과는 사용자/월 단위로 캐시되며, 일기나 사진이 추가/삭제되면 해당 월 캐시가 무효화됩니다.
     """
     try:
         year, month = map(int, year_month.split('-'))
-        uid = get_firebase_uid(token)
-        days = get_diary_days_in_month(year, month, uid)
+        uid = await get_firebase_uid(token)
+        days = await get_calendar_month(year, month, uid, db)
         return {"days": days}
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid year_month format. Use YYYY-MM")
@@ -233,10 +292,11 @@ def diary_days_by_month(
 @router.delete("/{id}")
 async def delete_diary_endpoint(
     id: int,
-    token: HTTPAuthorizationCredentials = Depends(auth_scheme)
+    token: HTTPAuthorizationCredentials = Depends(auth_scheme),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    uid = get_firebase_uid(token)
-    success = delete_diary(id=id, db=None, user_id=uid)
+    uid = await get_firebase_uid(token)
+    success = await delete_diary(id=id, db=db, user_id=uid)
     if not success:
         raise HTTPException(status_code=404, detail="Diary not found or not authorized.")
     return {"message": "Diary deleted successfully"}
@@ -246,10 +306,11 @@ async def delete_diary_endpoint(
 async def update_diary_content_endpoint(
     id: int,
     body: DiaryUpdateSchema,
-    token: HTTPAuthorizationCredentials = Depends(auth_scheme)
+    token: HTTPAuthorizationCredentials = Depends(auth_scheme),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    uid = get_firebase_uid(token)
-    success = update_diary_content(id=id, content=body.text, db=None, user_id=uid)
+    uid = await get_firebase_uid(token)
+    success = await update_diary_content(id=id, content=body.text, db=db, user_id=uid)
     if not success:
         raise HTTPException(status_code=404, detail="Diary not found or not authorized.")
     return {"message": "Diary content updated successfully"}
@@ -0,0 +1,31 @@
+import os
+import secrets
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException
+
+from backend.dependencies.db import get_pool_status
+
+router = APIRouter(prefix="/internal", tags=["Internal"])
+
+# 내부 엔드포인트 보호용 토큰 (X-Internal-Token 헤더 필요, 설정하지 않으면 내부 엔드포인트 비활성)
+INTERNAL_API_TOKEN = os.getenv('INTERNAL_API_TOKEN')
+
+
+def verify_internal_token(token: Optional[str]):
+    if not INTERNAL_API_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not token or not secrets.compare_digest(token, INTERNAL_API_TOKEN):
+        raise HTTPException(status_code=403, detail="내부 엔드포인트 접근 권한이 없습니다.")
+
+
+# DB 커넥션 풀 상태
+@router.get("/db-pool")
+async def db_pool_status(x_internal_token: Optional[str] = Header(None)):
+    """
+    현재 워커 프로세스의 DB 커넥션 풀 상태를 반환합니다.
+    - checked_out: 사용 중인 커넥션 수
+    - overflow: pool_size 를 넘어 추가로 열린 커넥션 수
+    - wait_*_ms: 커넥션 체크아웃 대기 시간 통계
+    """
+    verify_internal_token(x_internal_token)
+    return get_pool_status()
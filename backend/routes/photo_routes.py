@@ -1,44 +1,20 @@
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from backend.services.photo_service import upload_photo_with_description, delete_photo_by_id
-from backend.services.diary_service import get_diary_entry
+from fastapi.security import HTTPAuthorizationCredentials
+from backend.services.photo_service import upload_photo_with_description, delete_photo_by_id, get_photo, PhotoTooLargeError
+from backend.services.diary_service import is_diary_owner
 from fastapi.responses import JSONResponse
 from typing import List, Optional
-import firebase_admin
-from firebase_admin import auth
+from backend.dependencies.auth import auth_scheme, get_firebase_uid
+from backend.dependencies.db import get_async_db
+from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter(prefix="/photos", tags=["Photos"])
-auth_scheme = HTTPBearer()
-
-# Firebase Admin SDK 초기화 확인
-def ensure_firebase_initialized():
-    """Firebase Admin SDK가 초기화되었는지 확인하고, 필요시 초기화합니다."""
-    if not firebase_admin._apps:
-        print("Firebase Admin SDK가 초기화되지 않았습니다. 초기화 시도...")
-        from backend.dependencies.auth import initialize_firebase
-        initialize_firebase()
-
-# Firebase UID 추출 함수
-def get_firebase_uid(token: HTTPAuthorizationCredentials) -> str:
-    try:
-        ensure_firebase_initialized()
-        print(f"토큰 검증 시작 (photo_routes): {token.credentials[:50]}...")
-        decoded_token = auth.verify_id_token(token.credentials)
-        uid = decoded_token.get("uid")
-        print(f"토큰 검증 성공 (photo_routes): UID = {uid}")
-        return uid
-    except Exception as e:
-        print(f"토큰 검증 실패 (photo_routes): {e}")
-        raise HTTPException(status_code=401, detail=f"Invalid Firebase token: {str(e)}")
 
 # 일기 소유권 확인 함수
-def verify_diary_ownership(diary_id: int, user_id: str) -> bool:
+async def verify_diary_ownership(diary_id: int, user_id: str, db) -> bool:
     """일기가 해당 사용자의 것인지 확인합니다."""
     try:
-        diary = get_diary_entry(diary_id)
-        if not diary:
-            return False
-        return diary.user_id == user_id  # SQLAlchemy 객체의 속성으로 접근
+        return await is_diary_owner(diary_id, user_id, db)
     except Exception as e:
         print(f"일기 소유권 확인 실패: {e}")
         return False
@@ -48,7 +24,8 @@ def verify_diary_ownership(diary_id: int, user_id: str) -> bool:
 async def upload_photo(
     diary_id: int,
     photo: UploadFile = File(...),
-    token: HTTPAuthorizationCredentials = Depends(auth_scheme)
+    token: HTTPAuthorizationCredentials = Depends(auth_scheme),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     특정 일기에 사진을 업로드합니다.
@@ -57,39 +34,75 @@ async def upload_photo(
     - token: Firebase 인증 토큰
     
     사용자는 자신의 일기에만 사진을 업로드할 수 있습니다.
+    사진 설명은 워커가 생성하며, 완료 여부는 GET /photos/{diary_id}/photos/{photo_id} 로 확인합니다.
     """
     try:
         # 사용자 인증
-        uid = get_firebase_uid(token)
+        uid = await get_firebase_uid(token)
         
         # 일기 소유권 확인
-        if not verify_diary_ownership(diary_id, uid):
+        if not await verify_diary_ownership(diary_id, uid, db):
             raise HTTPException(
                 status_code=403, 
                 detail="이 일기에 사진을 업로드할 권한이 없습니다. 자신의 일기인지 확인해주세요."
             )
         
-        # 사진 업로드 및 Gemini API 설명 생성
-        photo_id, photo_url, photo_description = await upload_photo_with_description(
+        # 사진 업로드 및 Gemini API 설명 생성 작업 등록
+        photo_id, photo_url, photo_description, description_status = await upload_photo_with_description(
             diary_id=diary_id,
             photo=photo,
-            db=None
+            db=db
         )
         
         return {
             "photo_id": photo_id,
             "photo_url": photo_url,
             "photo_description": photo_description,
+            "description_status": description_status,
             "message": "사진이 성공적으로 업로드되었습니다."
         }
         
     except HTTPException:
         # HTTPException은 그대로 재발생
         raise
+    except PhotoTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         print(f"사진 업로드 실패: {e}")
         raise HTTPException(status_code=500, detail=f"사진 업로드 실패: {str(e)}")
 
+# 사진 설명 생성 상태 조회 (폴링용)
+@router.get("/{diary_id}/photos/{photo_id}")
+async def get_photo_status(
+    diary_id: int,
+    photo_id: int,
+    token: HTTPAuthorizationCredentials = Depends(auth_scheme),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    사진 정보와 설명 생성 상태를 조회합니다.
+    - description_status: pending(생성 중) / done(완료) / failed(실패, 기본 설명 사용)
+    """
+    uid = await get_firebase_uid(token)
+    
+    if not await verify_diary_ownership(diary_id, uid, db):
+        raise HTTPException(
+            status_code=403, 
+            detail="이 사진을 조회할 권한이 없습니다. 자신의 일기인지 확인해주세요."
+        )
+    
+    photo = await get_photo(diary_id, photo_id, db)
+    if not photo:
+        raise HTTPException(status_code=404, detail="사진을 찾을 수 없습니다.")
+    
+    return {
+        "photo_id": photo.id,
+        "photo_url": photo.path,
+        "thumbnail_url": photo.thumbnail_path,
+        "preview_url": photo.preview_path,
+        "photo_description": photo.description,
+        "description_status": photo.description_status
+    }
 
 
 # 사진 삭제    
@@ -97,7 +110,8 @@ async def upload_photo(
 async def delete_photo(
     diary_id: int,
     photo_id: int,
-    token: HTTPAuthorizationCredentials = Depends(auth_scheme)
+    token: HTTPAuthorizationCredentials = Depends(auth_scheme),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     특정 일기의 사진을 삭제합니다.
@@ -109,17 +123,17 @@ async def delete_photo(
     """
     try:
         # 사용자 인증
-        uid = get_firebase_uid(token)
+        uid = await get_firebase_uid(token)
         
         # 일기 소유권 확인
-        if not verify_diary_ownership(diary_id, uid):
+        if not await verify_diary_ownership(diary_id, uid, db):
             raise HTTPException(
                 status_code=403, 
                 detail="이 사진을 삭제할 권한이 없습니다. 자신의 일기인지 확인해주세요."
             )
         
         # 사진 삭제
-        success = delete_photo_by_id(diary_id, photo_id, None)
+        success = await delete_photo_by_id(diary_id, photo_id, db)
         
         if success:
             return {
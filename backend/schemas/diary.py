@@ -11,6 +11,9 @@ class PhotoCreate(BaseModel):
 class Photo(PhotoCreate):
     id: int
     diary_id: int
+    description_status: Optional[str] = None  # pending / done / failed
+    thumbnail_path: Optional[str] = None  # 128px 축소본 URL
+    preview_path: Optional[str] = None  # 512px 축소본 URL
     created_at: datetime
 
     class Config:
@@ -1,133 +1,310 @@
-from backend.dependencies.db import get_db_session
-from backend.models.diary import AIQueryLog
+import asyncio
+import os
+import re
+from datetime import datetime, timedelta
+from backend.dependencies.db import get_async_db_session
+from backend.models.diary import AIQueryLog, DiaryEntry, Photo
+from backend.services.gemini_service import generate_content_async, stream_content_async
+from backend.services.job_service import JobDeferred, enqueue_job
+from backend.services.summary_service import estimate_tokens, load_conversation_history, schedule_summary_if_needed
+from sqlalchemy import select, update, or_, func
 from pydantic import BaseModel
 from typing import Optional
 
+# 대화를 처음 열 때 보여주는 안내 메시지
+OPENING_GREETING = "일기를 생성하는거 도와줄게. 질문에 대답해줘"
+# 첫 질문 생성을 맡은 요청이 이 시간 안에 끝내지 못하면 다른 요청이 다시 맡음 (초)
+OPENING_CLAIM_TIMEOUT_SECONDS = int(os.getenv('OPENING_CLAIM_TIMEOUT_SECONDS', '60'))
+# 다른 프로세스가 생성 중일 때 결과를 기다리는 최대 시간 / 확인 간격 (초)
+OPENING_WAIT_SECONDS = float(os.getenv('OPENING_WAIT_SECONDS', '30'))
+OPENING_POLL_INTERVAL = 0.5
+
+# 첫 질문 미리 생성 작업 종류 (BackgroundJob.kind)
+OPENING_QUESTION_JOB = "opening_question"
+# 일기 생성 직후 워커에서 첫 질문을 미리 만들어 둘지 여부
+AI_PREGENERATE_OPENING = os.getenv('AI_PREGENERATE_OPENING', 'false').lower() == 'true'
+# 사진 설명이 아직 생성 중이면 이 간격으로 다시 확인하고, 최대 대기 시간이 지나면 있는 설명으로 생성 (초)
+OPENING_PREGENERATE_RECHECK_SECONDS = int(os.getenv('OPENING_PREGENERATE_RECHECK_SECONDS', '5'))
+OPENING_PREGENERATE_MAX_WAIT_SECONDS = int(os.getenv('OPENING_PREGENERATE_MAX_WAIT_SECONDS', '300'))
+
+# 프롬프트 전체의 토큰 예산 (대화 히스토리는 남는 만큼만 최근 것부터 채움)
+AI_PROMPT_TOKEN_BUDGET = int(os.getenv('AI_PROMPT_TOKEN_BUDGET', '3000'))
+
+# 대화 로그 한 페이지의 기본/최대 메시지 수
+AI_LOG_PAGE_SIZE = int(os.getenv('AI_LOG_PAGE_SIZE', '50'))
+AI_LOG_MAX_PAGE_SIZE = 200
+
+# 이 프로세스에서 진행 중인 첫 질문 생성 (diary_id → Task)
+_opening_tasks = {}
+
 
 class AIResponse(BaseModel):
     answer: str
     is_edit_text: bool
     edited_text: Optional[str] = None
 
-def fetch_ai_logs(diary_id: int, db):
-    db_session = get_db_session()
-    try:
-        logs = db_session.query(AIQueryLog).filter(
-            AIQueryLog.diary_id == diary_id
-        ).order_by(AIQueryLog.created_at).all()
-        
-        # SQLAlchemy 객체를 딕셔너리로 변환
-        result = []
-        for log in logs:
-            result.append({
-                "id": log.id,
-                "diary_id": log.diary_id,
-                "content": log.content,
-                "written_by": log.written_by,
-                "created_at": log.created_at.isoformat() if log.created_at else None
-            })
-        
-        return result
-    finally:
-        db_session.close()
-
-
-
-
-def generate_contextual_ai_conversation(diary_id: int, user_message: str):
+async def fetch_ai_logs(diary_id: int, db, before_id: Optional[int] = None, limit: Optional[int] = AI_LOG_PAGE_SIZE):
     """
-    일기의 사진 설명과 기존 대화 내용을 바탕으로 AI 대화를 생성합니다.
+    대화 로그를 id 기준 keyset 페이지로 조회합니다. (before_id 보다 오래된 메시지 중 최근 limit 개, 시간순)
+    대화가 길어져도 조회량과 응답 크기가 일정합니다. limit 이 None 이면 전체를 조회합니다.
+    반환: ([{"id", "by", "text"}], 더 오래된 메시지가 있는지 여부)
     """
-    db_session = get_db_session()
-    try:
-        # 1. 일기 정보 가져오기
-        from backend.models.diary import DiaryEntry, Photo, AIQueryLog
-        diary = db_session.query(DiaryEntry).filter(DiaryEntry.id == diary_id).first()
+    stmt = (
+        select(AIQueryLog.id, AIQueryLog.written_by, AIQueryLog.content)
+        .where(AIQueryLog.diary_id == diary_id)
+        .order_by(AIQueryLog.id.desc())
+    )
+    if limit is not None:
+        stmt = stmt.limit(limit + 1)
+    if before_id is not None:
+        stmt = stmt.where(AIQueryLog.id < before_id)
+    
+    rows = (await db.execute(stmt)).all()
+    
+    has_more = limit is not None and len(rows) > limit
+    chats = [{"id": log_id, "by": written_by, "text": content} for log_id, written_by, content in reversed(rows[:limit])]
+    return chats, has_more
+
+
+async def fetch_chats_in_session(db_session, diary_id: int):
+    """대화 로그를 {"by", "text"} 목록으로 조회합니다."""
+    result = await db_session.execute(
+        select(AIQueryLog.written_by, AIQueryLog.content)
+        .where(AIQueryLog.diary_id == diary_id)
+        .order_by(AIQueryLog.created_at, AIQueryLog.id)
+    )
+    return [{"by": written_by, "text": content} for written_by, content in result.all()]
+
+
+async def fetch_all_ai_logs(diary_id: int):
+    """전체 대화 로그를 {"id", "by", "text"} 목록으로 조회합니다. (짧은 세션)"""
+    async with get_async_db_session() as db_session:
+        chats, _ = await fetch_ai_logs(diary_id, db_session, limit=None)
+        return chats
+
+
+async def get_or_create_opening_chats(diary_id: int):
+    """
+    대화 내역이 없는 일기의 첫 AI 메시지(안내 + 첫 질문)를 한 번만 생성합니다.
+    - 같은 프로세스의 동시 요청은 하나의 생성 작업을 함께 기다리고
+    - 다른 프로세스와는 DiaryEntry.opening_claimed_at 조건부 UPDATE 로 한 곳만 생성합니다.
+    반환: {"id", "by", "text"} 목록 (일기가 없거나 다른 곳의 생성이 늦어지면 빈 목록)
+    """
+    task = _opening_tasks.get(diary_id)
+    if task is None:
+        task = asyncio.ensure_future(_create_opening_chats(diary_id))
+        _opening_tasks[diary_id] = task
+        task.add_done_callback(lambda _: _opening_tasks.pop(diary_id, None))
+    # 한 요청이 끊겨도 함께 기다리는 다른 요청의 생성 작업은 취소되지 않도록 shield
+    return await asyncio.shield(task)
+
+
+def schedule_opening_question(diary_id: int, db):
+    """AI_PREGENERATE_OPENING 이 켜져 있으면 첫 질문 미리 생성 작업을 등록합니다. (커밋은 요청 단위 세션에서)"""
+    if not AI_PREGENERATE_OPENING or not diary_id:
+        return
+    enqueue_job(db, OPENING_QUESTION_JOB, diary_id)
+
+
+# 작업 큐 핸들러: 사진 설명이 모두 준비되면 첫 질문을 미리 생성
+async def pregenerate_opening_question(diary_id: int):
+    async with get_async_db_session() as db_session:
+        diary = await db_session.get(DiaryEntry, diary_id)
         if not diary:
-            return {"is_successful": False, "error": "일기를 찾을 수 없습니다."}
-        
-        # 2. 사진 설명들 가져오기
-        photos = db_session.query(Photo).filter(Photo.diary_id == diary_id).all()
-        photo_descriptions = [photo.description for photo in photos if photo.description]
-        
-        # 3. 기존 대화 내용 가져오기
-        existing_chats = db_session.query(AIQueryLog).filter(
-            AIQueryLog.diary_id == diary_id
-        ).order_by(AIQueryLog.created_at).all()
-        
-        # 4. 사용자 메시지 저장
-        user_chat = AIQueryLog(
-            diary_id=diary_id,
-            content=user_message,
-            written_by="user"
+            print(f"일기 {diary_id}가 삭제되어 첫 질문 생성을 건너뜁니다.")
+            return
+        pending_photos = await db_session.scalar(
+            select(func.count()).select_from(Photo).where(
+                Photo.diary_id == diary_id,
+                Photo.description_status == "pending"
+            )
         )
-        db_session.add(user_chat)
-        db_session.commit()
-        
-        # 5. 대화 히스토리 구성
-        chat_history = []
-        for chat in existing_chats:
-            chat_history.append({
-                "by": chat.written_by,
-                "text": chat.content
-            })
-        
-        # 6. AI 응답 생성 로직
-        ai_response, is_edit_request, edited_text = generate_ai_response_logic(
-            diary, photo_descriptions, chat_history, user_message
+
+    waited = (datetime.utcnow() - diary.created_at).total_seconds() if diary.created_at else 0
+    if pending_photos and waited < OPENING_PREGENERATE_MAX_WAIT_SECONDS:
+        raise JobDeferred(OPENING_PREGENERATE_RECHECK_SECONDS, f"사진 설명 {pending_photos}개 생성 중")
+
+    # 이미 대화가 있거나 다른 곳에서 생성 중이면 아무것도 하지 않음
+    await get_or_create_opening_chats(diary_id)
+
+
+async def claim_opening_generation(db_session, diary_id: int) -> bool:
+    """첫 질문 생성 권한을 가져옵니다. (아무도 맡지 않았거나 맡은 지 오래된 경우에만 성공)"""
+    now = datetime.utcnow()
+    result = await db_session.execute(
+        update(DiaryEntry)
+        .where(
+            DiaryEntry.id == diary_id,
+            or_(
+                DiaryEntry.opening_claimed_at.is_(None),
+                DiaryEntry.opening_claimed_at < now - timedelta(seconds=OPENING_CLAIM_TIMEOUT_SECONDS)
+            )
         )
-        
-        # 7. AI 응답 저장
-        ai_chat = AIQueryLog(
-            diary_id=diary_id,
-            content=ai_response,
-            written_by="ai"
+        # 생성 권한 표시는 일기 수정이 아니므로 updated_at 은 그대로 둠 (onupdate 방지)
+        .values(opening_claimed_at=now, updated_at=DiaryEntry.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+    await db_session.commit()
+    return result.rowcount == 1
+
+
+async def release_opening_claim(diary_id: int):
+    """생성에 실패한 경우 다음 요청이 바로 다시 시도할 수 있도록 표시를 지웁니다."""
+    async with get_async_db_session() as db_session:
+        await db_session.execute(
+            update(DiaryEntry)
+            .where(DiaryEntry.id == diary_id)
+            .values(opening_claimed_at=None, updated_at=DiaryEntry.updated_at)
+            .execution_options(synchronize_session=False)
         )
-        db_session.add(ai_chat)
-        db_session.commit()
-        
-        # 8. 최종 응답 구성
-        chat_history.append({"by": "user", "text": user_message})
-        chat_history.append({"by": "ai", "text": ai_response})
-        
-        result = {
-            "is_successful": True,
-            "chats": chat_history,
-            "is_edit_text": is_edit_request
-        }
-        
-        if is_edit_request and edited_text:
-            result["edited_text"] = edited_text
-        
-        return result
-        
-    except Exception as e:
-        print(f"❌ AI 대화 생성 실패: {e}")
-        db_session.rollback()
-        return {"is_successful": False, "error": str(e)}
-    finally:
-        db_session.close()
+        await db_session.commit()
+
+
+async def _create_opening_chats(diary_id: int):
+    async with get_async_db_session() as db_session:
+        claimed = await claim_opening_generation(db_session, diary_id)
+        if claimed:
+            diary, photo_descriptions, history = await load_conversation_inputs(db_session, diary_id)
+        elif await db_session.scalar(select(DiaryEntry.id).where(DiaryEntry.id == diary_id)) is None:
+            # 조건부 UPDATE 가 0행인 이유가 "다른 곳에서 생성 중"이 아니라 일기가 없는 경우 → 기다리지 않음
+            return []
 
+    if not claimed:
+        # 다른 요청/프로세스가 생성 중이거나 이미 생성함 → 저장될 때까지 대기
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + OPENING_WAIT_SECONDS
+        while True:
+            chats = await fetch_all_ai_logs(diary_id)
+            if chats or loop.time() >= deadline:
+                return chats
+            await asyncio.sleep(OPENING_POLL_INTERVAL)
 
-def generate_ai_response_logic(diary, photo_descriptions, chat_history, user_message):
+    if not diary:
+        return []
+    if history["recent"]:
+        # 확인 사이에 이미 생성된 경우
+        return await fetch_all_ai_logs(diary_id)
+
+    try:
+        # 첫 번째 질문 생성 (사진 설명 기반) - DB 커넥션을 잡지 않은 상태에서 호출
+        first_question, _, _ = await generate_ai_response_logic(
+            diary, photo_descriptions, None, ""
+        )
+    except BaseException:
+        await release_opening_claim(diary_id)
+        raise
+
+    # 초기 AI 메시지들을 DB에 저장
+    chats = [
+        AIQueryLog(diary_id=diary_id, content=OPENING_GREETING, written_by="ai"),
+        AIQueryLog(diary_id=diary_id, content=first_question, written_by="ai"),
+    ]
+    async with get_async_db_session() as db_session:
+        db_session.add_all(chats)
+        await db_session.commit()
+
+    # 페이지 조회(next_before_id)에 쓰이도록 저장된 id 를 함께 반환
+    return [{"id": chat.id, "by": chat.written_by, "text": chat.content} for chat in chats]
+
+
+async def load_conversation_inputs(db_session, diary_id: int):
     """
-    Gemini API를 사용한 AI 응답 생성 로직
+    AI 응답 생성에 필요한 일기, 사진 설명 목록, 대화 히스토리(요약 + 최근 메시지)를 조회합니다.
+    일기가 없으면 (None, [], None) 을 반환합니다.
     """
-    from google import genai
+    diary = await db_session.get(DiaryEntry, diary_id)
+    if not diary:
+        return None, [], None
+    
+    photos = (await db_session.execute(
+        select(Photo).where(Photo.diary_id == diary_id)
+    )).scalars().all()
+    photo_descriptions = [photo.description for photo in photos if photo.description]
     
-    # Gemini API 클라이언트 생성
-    client = genai.Client()
+    history = await load_conversation_history(db_session, diary_id, AI_PROMPT_TOKEN_BUDGET)
+    return diary, photo_descriptions, history
+
+
+async def save_chat_messages(diary_id: int, user_message: str, ai_response: Optional[str], unsummarized_count: int = 0):
+    """
+    사용자 메시지와 AI 응답을 한 번의 배치 INSERT 로 저장합니다. (짧은 트랜잭션 하나)
+    ai_response 가 None 이면(생성 실패) 사용자 메시지만 저장해 입력이 사라지지 않도록 합니다.
+    """
+    chats = [AIQueryLog(diary_id=diary_id, content=user_message, written_by="user")]
+    if ai_response is not None:
+        chats.append(AIQueryLog(diary_id=diary_id, content=ai_response, written_by="ai"))
     
+    async with get_async_db_session() as db_session:
+        db_session.add_all(chats)
+        if ai_response is not None:
+            # 오래된 대화가 쌓였으면 요약 갱신 작업도 같은 트랜잭션에서 등록
+            await schedule_summary_if_needed(db_session, diary_id, unsummarized_count + len(chats))
+        await db_session.commit()
+
+
+async def generate_contextual_ai_conversation(diary_id: int, user_message: str, only_new: bool = False):
+    """
+    일기의 사진 설명과 기존 대화 내용을 바탕으로 AI 대화를 생성합니다.
+    only_new 이면 응답의 chats 에 이번 사용자 메시지와 AI 응답만 담습니다. (전체 대화 조회 생략)
+    
+    DB 작업은 Gemini 호출 앞뒤의 짧은 단계로 나누어, 생성하는 동안에는 커넥션을 잡고 있지 않습니다.
+    """
+    # 1~3. 일기 정보, 사진 설명들, 대화 히스토리(요약 + 최근 메시지) 가져오기 (읽기 전용 단계)
+    async with get_async_db_session() as db_session:
+        diary, photo_descriptions, history = await load_conversation_inputs(db_session, diary_id)
+        if not diary:
+            return {"is_successful": False, "error": "일기를 찾을 수 없습니다."}
+        chat_history = [] if only_new else await fetch_chats_in_session(db_session, diary_id)
+    
+    # 4. AI 응답 생성 (DB 커넥션 없이)
+    try:
+        ai_response, is_edit_request, edited_text = await generate_ai_response_logic(
+            diary, photo_descriptions, history, user_message
+        )
+    except Exception as e:
+        # 실패해도 사용자 메시지는 저장
+        if isinstance(e, asyncio.TimeoutError):
+            print(f"❌ AI 응답 시간 초과: diary {diary_id}")
+            error = "AI 응답 시간이 초과되었습니다."
+        else:
+            print(f"❌ AI 대화 생성 실패: {e}")
+            error = str(e)
+        await save_chat_messages(diary_id, user_message, None)
+        return {"is_successful": False, "error": error}
+    
+    # 5. 사용자 메시지 + AI 응답 저장 (배치 INSERT 한 번)
+    await save_chat_messages(diary_id, user_message, ai_response, history["unsummarized_count"])
+    
+    # 6. 최종 응답 구성
+    chat_history.append({"by": "user", "text": user_message})
+    chat_history.append({"by": "ai", "text": ai_response})
+    
+    result = {
+        "is_successful": True,
+        "chats": chat_history,
+        "is_edit_text": is_edit_request
+    }
+    
+    if is_edit_request and edited_text:
+        result["edited_text"] = edited_text
+    
+    return result
+
+
+async def generate_ai_response_logic(diary, photo_descriptions, history, user_message):
+    """
+    Gemini API를 사용한 AI 응답 생성 로직 (비동기 호출, GEMINI_CHAT_TIMEOUT_SECONDS 제한)
+    history: load_conversation_history 결과 (첫 질문이면 None)
+    """
     # 컨텍스트 구성
-    context = build_conversation_context(diary, photo_descriptions, chat_history)
+    context = build_conversation_context(diary, photo_descriptions, history)
     
     # Gemini 프롬프트 구성
     prompt = build_gemini_prompt(context, user_message)
     
     # 구조화된 응답을 위한 Gemini API 호출
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=prompt,
+    response = await generate_content_async(
+        prompt,
         config={
             "response_mime_type": "application/json",
             "response_schema": AIResponse,
@@ -139,43 +316,178 @@ def generate_ai_response_logic(diary, photo_descriptions, chat_history, user_mes
     return ai_response.answer, ai_response.is_edit_text, ai_response.edited_text
 
 
-def build_conversation_context(diary, photo_descriptions, chat_history):
+class AnswerStreamParser:
+    """
+    스트리밍으로 들어오는 JSON 응답 조각에서 "answer" 문자열 값을 앞에서부터 꺼냅니다.
+    feed() 는 이번 조각으로 새로 확정된 answer 텍스트만 반환합니다.
+    """
+    ANSWER_START = re.compile(r'"answer"\s*:\s*"')
+    ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+    def __init__(self):
+        self.buffer = ""
+        self.answer_done = False
+        self._pos = None  # buffer 에서 다음에 읽을 answer 값 위치
+
+    def feed(self, chunk: str) -> str:
+        self.buffer += chunk
+        if self.answer_done:
+            return ""
+        if self._pos is None:
+            match = self.ANSWER_START.search(self.buffer)
+            if not match:
+                return ""
+            self._pos = match.end()
+
+        buf, pos, out = self.buffer, self._pos, []
+        while pos < len(buf):
+            ch = buf[pos]
+            if ch == '"':
+                self.answer_done = True
+                break
+            if ch != '\\':
+                out.append(ch)
+                pos += 1
+                continue
+            # 이스케이프: 끝까지 도착하지 않았으면 다음 조각을 기다림
+            if pos + 1 >= len(buf):
+                break
+            if buf[pos + 1] != 'u':
+                out.append(self.ESCAPES.get(buf[pos + 1], buf[pos + 1]))
+                pos += 2
+                continue
+            if pos + 6 > len(buf):
+                break
+            code = int(buf[pos + 2:pos + 6], 16)
+            if 0xD800 <= code < 0xDC00:
+                # 서로게이트 쌍 (이모지 등)
+                if pos + 12 > len(buf):
+                    break
+                low = int(buf[pos + 8:pos + 12], 16)
+                out.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                pos += 12
+            else:
+                out.append(chr(code))
+                pos += 6
+        self._pos = pos
+        return "".join(out)
+
+    def result(self, streamed_answer: str) -> AIResponse:
+        """전체 응답을 AIResponse 로 파싱합니다. (JSON 이 깨졌으면 스트리밍된 answer 만 사용)"""
+        try:
+            return AIResponse.model_validate_json(self.buffer)
+        except ValueError:
+            return AIResponse(answer=streamed_answer, is_edit_text=False)
+
+
+async def stream_contextual_ai_conversation(diary_id: int, user_message: str):
+    """
+    AI 응답을 생성되는 대로 흘려보냅니다. (async generator)
+    ("delta", {"text": ...}) 를 여러 번 내보낸 뒤 마지막에 ("done", {...}) 또는 ("error", {...}) 를 내보냅니다.
+    사용자 메시지와 AI 응답은 스트림이 끝난 뒤 함께 저장하며, 생성에 실패하면 사용자 메시지만 저장합니다.
+    """
+    async with get_async_db_session() as db_session:
+        diary, photo_descriptions, history = await load_conversation_inputs(db_session, diary_id)
+        if not diary:
+            yield "error", {"error": "일기를 찾을 수 없습니다."}
+            return
+
+    # 생성 중에는 DB 커넥션을 잡고 있지 않음
+    context = build_conversation_context(diary, photo_descriptions, history)
+    prompt = build_gemini_prompt(context, user_message)
+    parser = AnswerStreamParser()
+    streamed = []
+    try:
+        async for text in stream_content_async(
+            prompt,
+            config={
+                "response_mime_type": "application/json",
+                "response_schema": AIResponse,
+            },
+        ):
+            delta = parser.feed(text)
+            if delta:
+                streamed.append(delta)
+                yield "delta", {"text": delta}
+    except asyncio.TimeoutError:
+        print(f"❌ AI 응답 시간 초과: diary {diary_id}")
+        await save_chat_messages(diary_id, user_message, None)
+        yield "error", {"error": "AI 응답 시간이 초과되었습니다."}
+        return
+    except Exception as e:
+        print(f"❌ AI 스트리밍 실패: {e}")
+        await save_chat_messages(diary_id, user_message, None)
+        yield "error", {"error": str(e)}
+        return
+    except BaseException:
+        # 클라이언트 연결 끊김 등으로 스트림이 취소된 경우에도 사용자 메시지는 남김
+        await asyncio.shield(save_chat_messages(diary_id, user_message, None))
+        raise
+
+    ai_response = parser.result("".join(streamed))
+    await save_chat_messages(diary_id, user_message, ai_response.answer, history["unsummarized_count"])
+
+    done = {"answer": ai_response.answer, "is_edit_text": ai_response.is_edit_text}
+    if ai_response.is_edit_text and ai_response.edited_text:
+        done["edited_text"] = ai_response.edited_text
+    yield "done", done
+
+
+def fit_chat_history(chat_history, budget: int) -> list:
+    """요약 이후 메시지 중 토큰 예산 안에 들어가는 만큼을 최근 것부터 골라 시간순으로 반환합니다."""
+    lines = []
+    for chat in reversed(chat_history):
+        line = f"{chat['by']}: {chat['text']}"
+        budget -= estimate_tokens(line)
+        if budget < 0:
+            break
+        lines.append(line)
+    lines.reverse()
+    return lines
+
+
+def build_conversation_context(diary, photo_descriptions, history):
     """대화 컨텍스트를 구성합니다."""
+    history = history or {}
     context = {
         "diary_date": diary.date.strftime("%Y-%m-%d") if diary.date else "알 수 없음",
         "diary_content": diary.content or "",
         "photo_descriptions": photo_descriptions,
-        "chat_history": chat_history,
-        "user_response_count": len([chat for chat in chat_history if chat["by"] == "user"])
+        "summary": history.get("summary", ""),
+        "chat_history": history.get("recent", []),
+        "user_response_count": history.get("user_response_count", 0)
     }
     return context
 
 
 def build_gemini_prompt(context, user_message):
-    """Gemini API용 프롬프트를 구성합니다."""
+    """
+    Gemini API용 프롬프트를 구성합니다.
+    이전 대화는 요약 + 토큰 예산(AI_PROMPT_TOKEN_BUDGET) 안의 최근 메시지만 넣어 대화가 길어져도 크기가 일정합니다.
+    """
     photo_context = ""
     if context["photo_descriptions"]:
         photo_context = f"사진 설명들: {' | '.join(context['photo_descriptions'])}\n"
     
-    chat_history_text = ""
-    for chat in context["chat_history"]:
-        chat_history_text += f"{chat['by']}: {chat['text']}\n"
+    summary_context = ""
+    if context["summary"]:
+        summary_context = f"이전 대화 요약: {context['summary']}\n"
     
-    prompt = f"""
+    prompt_template = """
 당신은 친근하고 도움이 되는 AI 어시스턴트입니다. 사용자의 일기 작성을 도와주세요.
 
 {photo_context}
-일기 날짜: {context['diary_date']}
-현재 일기 내용: {context['diary_content']}
+일기 날짜: {diary_date}
+현재 일기 내용: {diary_content}
 
-기존 대화:
+{summary_context}기존 대화:
 {chat_history_text}
 
 사용자 메시지: {user_message}
 
 다음 규칙을 따라 응답해주세요:
 
-1. 사용자가 2개 질문에 답하기 전까지는 질문만 하세요.
+1. 사용자가 2개 질문에 답하기 전까지는 질문만 하세요. (지금까지 사용자 답변 수: {user_response_count})
 2. 수정 요청이면 is_edit_text를 true로 설정하고 수정된 내용을 edited_text에 제공하세요.
 3. 일기 생성 요청이면 is_edit_text를 true로 설정하고 생성된 일기를 edited_text에 제공하세요.
 4. 일반 대화면 친근하게 응답하고 is_edit_text를 false로 설정하세요.
@@ -189,9 +501,16 @@ JSON 응답 형식:
 
 응답:
 """
-    return prompt
-
-
-
-
-
+    fields = {
+        "photo_context": photo_context,
+        "diary_date": context["diary_date"],
+        "diary_content": context["diary_content"],
+        "summary_context": summary_context,
+        "user_message": user_message,
+        "user_response_count": context["user_response_count"],
+    }
+    
+    # 고정 부분을 뺀 나머지 예산으로 최근 대화를 채움
+    fixed_tokens = estimate_tokens(prompt_template.format(chat_history_text="", **fields))
+    history_lines = fit_chat_history(context["chat_history"], AI_PROMPT_TOKEN_BUDGET - fixed_tokens)
+    return prompt_template.format(chat_history_text="\n".join(history_lines), **fields)
@@ -0,0 +1,124 @@
+import json
+import os
+from datetime import datetime, timedelta
+from functools import partial
+from sqlalchemy import select, update, insert
+from sqlalchemy.exc import IntegrityError
+from backend.dependencies.db import get_async_db_session, add_after_commit_hook
+from backend.models.diary import CalendarMonthSummary, DiaryEntry
+
+# 캐시 최대 보관 시간 (초) - 무효화가 누락되더라도 이 시간이 지나면 다시 계산
+CALENDAR_CACHE_TTL_SECONDS = int(os.getenv('CALENDAR_CACHE_TTL_SECONDS', str(24 * 60 * 60)))
+
+# 세션에 모아 두었다가 커밋 후 무효화할 (user_id, YYYY-MM) 목록 (session.info 키)
+_DIRTY_MONTHS = "calendar_dirty_months"
+
+
+def month_key(year: int, month: int) -> str:
+    return f"{year:04d}-{month:02d}"
+
+
+def _month_row(user_id: str, year_month: str):
+    return (
+        CalendarMonthSummary.user_id == user_id,
+        CalendarMonthSummary.year_month == year_month
+    )
+
+
+# 캐시된 월 달력 조회
+async def get_cached_month(db, user_id: str, year: int, month: int):
+    """
+    반환: (days, version)
+    - days: 캐시된 날짜별 목록 (없거나, 무효화됐거나, 오래됐으면 None)
+    - version: 저장할 때 비교할 캐시 행 버전 (행이 없으면 None)
+    """
+    row = (await db.execute(
+        select(CalendarMonthSummary.days, CalendarMonthSummary.version, CalendarMonthSummary.updated_at)
+        .where(*_month_row(user_id, month_key(year, month)))
+    )).first()
+    if not row:
+        return None, None
+    if not row.days:
+        return None, row.version
+    if row.updated_at and row.updated_at < datetime.utcnow() - timedelta(seconds=CALENDAR_CACHE_TTL_SECONDS):
+        return None, row.version
+    return json.loads(row.days), row.version
+
+
+# 계산한 월 달력 저장 (커밋은 호출한 쪽에서)
+async def store_cached_month(db, user_id: str, year: int, month: int, days: list, version):
+    """
+    조회했을 때의 버전이 그대로일 때만 저장합니다.
+    그 사이 일기/사진 변경으로 무효화(버전 증가)됐으면, 변경 전 데이터로 계산했을 수 있으므로 저장하지 않습니다.
+    """
+    year_month = month_key(year, month)
+    payload = json.dumps(days, ensure_ascii=False)
+    now = datetime.utcnow()
+    if version is None:
+        try:
+            async with db.begin_nested():
+                await db.execute(insert(CalendarMonthSummary).values(
+                    user_id=user_id, year_month=year_month, days=payload, version=0, updated_at=now
+                ))
+        except IntegrityError:
+            # 동시에 다른 요청이 저장했거나 무효화 표시가 먼저 들어감
+            pass
+        return
+    await db.execute(
+        update(CalendarMonthSummary)
+        .where(*_month_row(user_id, year_month), CalendarMonthSummary.version == version)
+        .values(days=payload, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def _bump_month(db_session, user_id: str, year_month: str):
+    """캐시 행의 버전을 올리고 내용을 비웁니다. (행이 없으면 무효화 표시 행을 만듦)"""
+    bump = (
+        update(CalendarMonthSummary)
+        .where(*_month_row(user_id, year_month))
+        .values(version=CalendarMonthSummary.version + 1, days="", updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    if (await db_session.execute(bump)).rowcount:
+        return
+    try:
+        async with db_session.begin_nested():
+            await db_session.execute(insert(CalendarMonthSummary).values(
+                user_id=user_id, year_month=year_month, days="", version=1, updated_at=datetime.utcnow()
+            ))
+    except IntegrityError:
+        # 그 사이 다른 요청이 행을 저장함 → 그 행을 무효화
+        await db_session.execute(bump)
+
+
+async def flush_month_invalidations(db):
+    """세션에 모인 월 캐시 무효화를 짧은 별도 세션에서 적용합니다. (변경 트랜잭션이 커밋된 뒤 실행)"""
+    months = db.info.pop(_DIRTY_MONTHS, set())
+    if not months:
+        return
+    async with get_async_db_session() as db_session:
+        for user_id, year_month in sorted(months):
+            await _bump_month(db_session, user_id, year_month)
+        await db_session.commit()
+
+
+# 일기 생성/삭제 시 해당 월 캐시 무효화 (변경이 커밋된 뒤에 적용)
+def invalidate_month(db, user_id: str, target_date):
+    """
+    변경 트랜잭션 안에서 캐시 행을 지우면, 그 사이 변경 전 데이터로 계산한 결과가 다시 저장될 수 있습니다.
+    그래서 커밋 후 작업으로 버전을 올리고, 저장은 버전이 같을 때만 하도록 합니다.
+    """
+    if not user_id or not target_date:
+        return
+    db.info.setdefault(_DIRTY_MONTHS, set()).add((user_id, month_key(target_date.year, target_date.month)))
+    add_after_commit_hook(db, "calendar", partial(flush_month_invalidations, db))
+
+
+# 사진 추가/삭제 시 (첫 사진 = 달력 썸네일이 바뀔 수 있음) 일기가 속한 월 캐시 무효화
+async def invalidate_month_for_diary(db, diary_id: int):
+    row = (await db.execute(
+        select(DiaryEntry.user_id, DiaryEntry.date).where(DiaryEntry.id == diary_id)
+    )).first()
+    if row:
+        invalidate_month(db, row.user_id, row.date)
@@ -0,0 +1,49 @@
+import os
+from datetime import datetime
+from sqlalchemy import select, func, delete
+from sqlalchemy.exc import IntegrityError
+from backend.models.diary import PhotoDescriptionCache
+
+# 캐시에 보관할 최대 설명 개수 (넘으면 가장 오래 쓰지 않은 것부터 삭제)
+PHOTO_DESCRIPTION_CACHE_MAX_ENTRIES = int(os.getenv('PHOTO_DESCRIPTION_CACHE_MAX_ENTRIES', '10000'))
+
+
+# 캐시 조회 (있으면 사용 시각/횟수 갱신)
+async def get_cached_description(db, image_hash: str):
+    entry = await db.get(PhotoDescriptionCache, image_hash)
+    if not entry:
+        return None
+    entry.hit_count += 1
+    entry.last_used_at = datetime.utcnow()
+    await db.commit()
+    return entry.description
+
+
+# 캐시 저장 (다른 워커가 먼저 저장했으면 그대로 둠)
+async def store_description(db, image_hash: str, description: str):
+    db.add(PhotoDescriptionCache(image_hash=image_hash, description=description))
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        return
+    await evict_description_cache(db)
+
+
+# 개수 제한을 넘는 만큼 가장 오래 쓰지 않은 항목 삭제
+async def evict_description_cache(db, max_entries: int = PHOTO_DESCRIPTION_CACHE_MAX_ENTRIES):
+    overflow = await db.scalar(select(func.count()).select_from(PhotoDescriptionCache)) - max_entries
+    if overflow <= 0:
+        return 0
+    # MySQL 은 IN 서브쿼리에 LIMIT 를 쓸 수 없으므로 키를 먼저 조회
+    stale_hashes = (await db.execute(
+        select(PhotoDescriptionCache.image_hash)
+        .order_by(PhotoDescriptionCache.last_used_at)
+        .limit(overflow)
+    )).scalars().all()
+    await db.execute(
+        delete(PhotoDescriptionCache).where(PhotoDescriptionCache.image_hash.in_(stale_hashes))
+    )
+    await db.commit()
+    print(f"사진 설명 캐시 {len(stale_hashes)}개 삭제 (최대 {max_entries}개)")
+    return len(stale_hashes)
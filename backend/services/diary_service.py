@@ -1,160 +1,251 @@
+import os
 import calendar
 from datetime import date
-from sqlalchemy.orm import Session
-from sqlalchemy import text
-from backend.dependencies.db import get_db_session
-from backend.models.diary import DiaryEntry, Photo, AIQueryLog
-
-# 일기 생성
-def create_diary_entry(date: date, user_id: str, content: str = "", mood: str = "") -> int:
-    db = get_db_session()
+from sqlalchemy import select, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
+from backend.models.diary import DiaryEntry, Photo
+from backend.services.photo_service import release_photo_files
+from backend.services.summary_service import delete_conversation_summary
+from backend.services.calendar_service import get_cached_month, store_cached_month, invalidate_month, month_key
+
+# 여러 달 달력 조회 시 한 번에 조회할 수 있는 최대 개월 수
+CALENDAR_RANGE_MAX_MONTHS = int(os.getenv('CALENDAR_RANGE_MAX_MONTHS', '24'))
+
+class DiaryAlreadyExistsError(Exception):
+    """같은 사용자의 같은 날짜 일기가 이미 있는 경우 (동시 생성 포함)"""
+
+
+# 일기 생성 (커밋은 요청 단위 세션에서, 실패하면 예외를 그대로 올려 요청 전체를 롤백)
+async def create_diary_entry(date: date, user_id: str, content: str = "", mood: str = "", db=None) -> int:
+    diary = DiaryEntry(
+        date=date,
+        user_id=user_id,
+        content=content,
+        mood=mood
+    )
+    db.add(diary)
     try:
-        diary = DiaryEntry(
-            date=date,
-            user_id=user_id,
-            content=content,
-            mood=mood
+        await db.flush()
+    except IntegrityError as e:
+        # uq_diaryentry_user_date: 존재 확인 이후 다른 요청이 같은 날짜 일기를 먼저 만든 경우
+        raise DiaryAlreadyExistsError(f"{date} 날짜에 이미 일기가 존재합니다.") from e
+    invalidate_month(db, user_id, date)
+    print(f"✅ 일기 생성 성공! ID: {diary.id}")
+    return diary.id
+
+
+# 일기 불러오기 (사진/대화 내역 포함, 2회 왕복)
+async def get_diary_entry(diary_id: int, db, user_id: str = None):
+    stmt = (
+        select(DiaryEntry)
+        .options(
+            joinedload(DiaryEntry.photos),    # 사진은 적으므로 같은 쿼리에서 JOIN
+            selectinload(DiaryEntry.queries)  # 대화 내역은 IN 쿼리 한 번으로
         )
-        db.add(diary)
-        db.commit()
-        db.refresh(diary)
-        print(f"✅ 일기 생성 성공! ID: {diary.id}")
-        return diary.id
-    except Exception as e:
-        print(f"❌ 일기 생성 실패: {e}")
-        db.rollback()
-        return 0
-    finally:
-        db.close()
-
-
-# 일기 불러오기
-def get_diary_entry(diary_id: int):
-    db = get_db_session()
-    try:
-        diary = db.query(DiaryEntry).filter(DiaryEntry.id == diary_id).first()
-        if not diary:
-            return None
-        
-        # 관계 데이터 로드
-        diary.photos = db.query(Photo).filter(Photo.diary_id == diary_id).all()
-        diary.queries = db.query(AIQueryLog).filter(AIQueryLog.diary_id == diary_id).all()
-        
-        return diary
-    finally:
-        db.close()
+        .where(DiaryEntry.id == diary_id)
+    )
+    if user_id is not None:
+        stmt = stmt.where(DiaryEntry.user_id == user_id)
+
+    result = await db.execute(stmt)
+    return result.unique().scalars().first()
+
+
+# 일기 소유권 확인 (관계 데이터 없이 존재 여부만 조회)
+async def is_diary_owner(diary_id: int, user_id: str, db) -> bool:
+    found = await db.scalar(
+        select(DiaryEntry.id).where(
+            DiaryEntry.id == diary_id,
+            DiaryEntry.user_id == user_id
+        )
+    )
+    return found is not None
 
 
 # 날짜 기반 일기 유무 확인
-def diary_exists_by_date(target_date: date, user_id: str) -> bool:
-    db = get_db_session()
-    try:
-        count = db.query(DiaryEntry).filter(
+async def diary_exists_by_date(target_date: date, user_id: str, db) -> bool:
+    return await get_diary_id_by_date(target_date, user_id, db) is not None
+
+
+# 날짜로 일기 ID 조회 (없으면 None)
+async def get_diary_id_by_date(target_date: date, user_id: str, db):
+    return await db.scalar(
+        select(DiaryEntry.id).where(
             DiaryEntry.date == target_date,
             DiaryEntry.user_id == user_id
-        ).count()
-        return count > 0
-    finally:
-        db.close()
+        )
+    )
 
 
 # 날짜로 일기 조회
-def get_diary_by_date(target_date: date, user_id: str):
-    db = get_db_session()
-    try:
-        diary = db.query(DiaryEntry).filter(
+async def get_diary_by_date(target_date: date, user_id: str, db):
+    result = await db.execute(
+        select(DiaryEntry).where(
             DiaryEntry.date == target_date,
             DiaryEntry.user_id == user_id
-        ).first()
-        return diary
-    finally:
-        db.close()
+        )
+    )
+    return result.scalars().first()
 
 
-# 특정 달의 일기 존재 여부 및 대표 이미지
-def get_diary_days_in_month(year: int, month: int, user_id: str):
-    db = get_db_session()
-    try:
-        # 해당 월의 일기들 조회
-        entries = db.query(DiaryEntry).filter(
+def month_date_range(year: int, month: int):
+    """해당 월의 [첫날, 다음 달 첫날) 범위를 반환합니다. (인덱스를 탈 수 있는 범위 조건용)"""
+    first_day = date(year, month, 1)
+    next_month = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return first_day, next_month
+
+
+async def query_diary_days(first_day: date, end_day: date, user_id: str, db) -> dict:
+    """[first_day, end_day) 범위의 일기와 대표 이미지를 한 번에 조회합니다. 반환: {날짜: {"thumbnail", "diary_id"}}"""
+    # 각 일기의 첫 번째 사진을 썸네일로 사용 (상관 서브쿼리로 같은 쿼리에서 조회)
+    # 128px 축소본이 있으면 축소본, 없으면(기존 사진) 원본 URL
+    thumbnail = (
+        select(func.coalesce(Photo.thumbnail_path, Photo.path))
+        .where(Photo.diary_id == DiaryEntry.id)
+        .order_by(Photo.id)
+        .limit(1)
+        .correlate(DiaryEntry)
+        .scalar_subquery()
+    )
+
+    rows = (await db.execute(
+        select(DiaryEntry.id, DiaryEntry.date, thumbnail.label("thumbnail")).where(
             DiaryEntry.user_id == user_id,
-            text("YEAR(date) = :year AND MONTH(date) = :month")
-        ).params(year=year, month=month).all()
-        
-        # 썸네일 정보와 diary_id 포함하여 조회
-        diary_map = {}
-        for entry in entries:
-            # 각 일기의 첫 번째 사진을 썸네일로 사용
-            thumbnail = db.query(Photo.path).filter(
-                Photo.diary_id == entry.id
-            ).first()
-            diary_map[entry.date.day] = {
-                "thumbnail": thumbnail[0] if thumbnail else None,
-                "diary_id": entry.id
-            }
-        
-        _, last_day = calendar.monthrange(year, month)
-        result = []
-
-        for day in range(1, last_day + 1):
-            day_info = diary_map.get(day)
-            result.append({
-                "day": day,
-                "has_diary": day in diary_map,
-                "thumbnail": day_info["thumbnail"] if day_info else None,
-                "diary_id": day_info["diary_id"] if day_info else None
-            })
-
-        return result
-    finally:
-        db.close()
-
-
-# 일기 내용 수정
-def update_diary_content(id: int, content: str, db, user_id: str) -> bool:
-    db_session = get_db_session()
-    try:
-        diary = db_session.query(DiaryEntry).filter(
+            DiaryEntry.date >= first_day,
+            DiaryEntry.date < end_day
+        )
+    )).all()
+
+    # 썸네일 정보와 diary_id 포함
+    return {
+        row.date: {"thumbnail": row.thumbnail, "diary_id": row.id}
+        for row in rows
+    }
+
+
+def build_month_days(year: int, month: int, diary_map: dict) -> list:
+    """조회한 일기 정보로 해당 월의 날짜별 목록을 만듭니다."""
+    _, last_day = calendar.monthrange(year, month)
+    result = []
+
+    for day in range(1, last_day + 1):
+        day_info = diary_map.get(date(year, month, day))
+        result.append({
+            "day": day,
+            "has_diary": day_info is not None,
+            "thumbnail": day_info["thumbnail"] if day_info else None,
+            "diary_id": day_info["diary_id"] if day_info else None
+        })
+
+    return result
+
+
+def build_month_bitmap(year: int, month: int, diary_map: dict) -> dict:
+    """날짜별 목록 대신 일기가 있는 날을 비트(1일 = 최하위 비트)로 표시한 요약을 만듭니다."""
+    _, last_day = calendar.monthrange(year, month)
+    bitmap = 0
+    diaries = []
+
+    for day in range(1, last_day + 1):
+        day_info = diary_map.get(date(year, month, day))
+        if day_info:
+            bitmap |= 1 << (day - 1)
+            diaries.append({"day": day, **day_info})
+
+    return {"last_day": last_day, "bitmap": bitmap, "diaries": diaries}
+
+
+# 특정 달의 일기 존재 여부 및 대표 이미지
+async def get_diary_days_in_month(year: int, month: int, user_id: str, db):
+    first_day, next_month = month_date_range(year, month)
+    diary_map = await query_diary_days(first_day, next_month, user_id, db)
+    return build_month_days(year, month, diary_map)
+
+
+# 여러 달의 달력 (범위 전체를 쿼리 한 번으로 조회)
+async def get_diary_days_in_range(start: tuple, end: tuple, user_id: str, db, bitmap: bool = False):
+    """
+    start, end: (year, month), 양 끝 포함
+    반환: [{"year_month": "YYYY-MM", "days": [...]}] 또는 bitmap=True 이면 [{"year_month", "last_day", "bitmap", "diaries"}]
+    """
+    # 목록을 만들기 전에 개월 수를 계산해 범위부터 검사 (먼 범위로 큰 목록을 만들지 않도록)
+    month_count = (end[0] - start[0]) * 12 + (end[1] - start[1]) + 1
+    if month_count <= 0:
+        raise ValueError("시작 월이 끝 월보다 늦습니다.")
+    if month_count > CALENDAR_RANGE_MAX_MONTHS:
+        raise ValueError(f"최대 {CALENDAR_RANGE_MAX_MONTHS}개월까지 조회할 수 있습니다.")
+
+    months = []
+    year, month = start
+    for _ in range(month_count):
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+    first_day, _ = month_date_range(*months[0])
+    _, end_day = month_date_range(*months[-1])
+    diary_map = await query_diary_days(first_day, end_day, user_id, db)
+
+    result = []
+    for year, month in months:
+        if bitmap:
+            result.append({"year_month": month_key(year, month), **build_month_bitmap(year, month, diary_map)})
+        else:
+            result.append({"year_month": month_key(year, month), "days": build_month_days(year, month, diary_map)})
+    return result
+
+
+# 월별 달력 조회 (캐시 키 하나로 조회, 없으면 계산해서 저장)
+async def get_calendar_month(year: int, month: int, user_id: str, db):
+    if not 1 <= month <= 12:
+        raise ValueError(f"잘못된 월: {month}")
+    days, version = await get_cached_month(db, user_id, year, month)
+    if days is None:
+        days = await get_diary_days_in_month(year, month, user_id, db)
+        await store_cached_month(db, user_id, year, month, days, version)
+    return days
+
+
+# 일기 내용 수정 (커밋은 요청 단위 세션에서, 실패하면 예외를 그대로 올려 요청 전체를 롤백)
+async def update_diary_content(id: int, content: str, db, user_id: str) -> bool:
+    result = await db.execute(
+        select(DiaryEntry).where(
             DiaryEntry.id == id,
             DiaryEntry.user_id == user_id
-        ).first()
-        
-        if diary:
-            diary.content = content
-            db_session.commit()
-            return True
-        return False
-    except Exception as e:
-        print(f"❌ 일기 수정 실패: {e}")
-        db_session.rollback()
-        return False
-    finally:
-        db_session.close()
+        )
+    )
+    diary = result.scalars().first()
+    
+    if diary:
+        diary.content = content
+        await db.flush()
+        return True
+    return False
 
 
-# 일기 삭제
-def delete_diary(id: int, db, user_id: str) -> bool:
-    db_session = get_db_session()
-    try:
-        # 일기 조회
-        diary = db_session.query(DiaryEntry).filter(
+# 일기 삭제 (커밋은 요청 단위 세션에서, 사진 파일과 달력 캐시는 커밋이 확정된 뒤에 정리)
+async def delete_diary(id: int, db, user_id: str) -> bool:
+    # 일기 조회
+    result = await db.execute(
+        select(DiaryEntry).where(
             DiaryEntry.id == id,
             DiaryEntry.user_id == user_id
-        ).first()
-        
-        if not diary:
-            print(f"일기 {id}를 찾을 수 없거나 삭제할 권한이 없습니다.")
-            return False
-        
-        # CASCADE 설정으로 인해 관련 데이터는 자동 삭제됨
-        db_session.delete(diary)
-        db_session.commit()
-        print(f"일기 {id}와 관련 데이터가 성공적으로 삭제되었습니다.")
-        return True
-        
-    except Exception as e:
-        print(f"❌ 일기 삭제 실패: {e}")
-        db_session.rollback()
+        )
+    )
+    diary = result.scalars().first()
+    
+    if not diary:
+        print(f"일기 {id}를 찾을 수 없거나 삭제할 권한이 없습니다.")
         return False
-    finally:
-        db_session.close()
+    
+    # CASCADE 설정으로 인해 관련 데이터는 자동 삭제됨
+    # (비동기 세션에서는 delete-orphan 처리를 위해 관계를 미리 로드해야 함)
+    await db.refresh(diary, attribute_names=["photos", "queries"])
+    # 다른 일기에서 참조하지 않는 사진 파일은 커밋 후 작업으로 정리
+    release_photo_files(db, [(photo.content_hash, photo.path) for photo in diary.photos])
+    await db.delete(diary)
+    await delete_conversation_summary(db, id)
+    invalidate_month(db, diary.user_id, diary.date)
+    await db.flush()
+    print(f"일기 {id}와 관련 데이터 삭제 (사진 파일은 커밋 후 정리)")
+    return True
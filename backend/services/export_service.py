@@ -0,0 +1,230 @@
+import json
+import os
+import zipfile
+import anyio
+from sqlalchemy import select, or_, and_
+from backend.dependencies.db import get_async_db_session
+from backend.models.diary import DiaryEntry, Photo, AIQueryLog
+from backend.services.photo_service import photo_file_path
+
+# 한 번에 조회하는 행 수 (배치마다 짧은 세션을 열고 바로 반납)
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '500'))
+# 응답으로 한 번에 내보내는 청크 크기 (바이트)
+EXPORT_CHUNK_BYTES = int(os.getenv('EXPORT_CHUNK_BYTES', str(64 * 1024)))
+
+EXPORT_NDJSON_NAME = "diary_export.ndjson"
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+async def _iter_batches(build_query, next_key):
+    """
+    keyset 페이지로 EXPORT_BATCH_SIZE 개씩 조회해 행을 하나씩 반환합니다.
+    배치마다 세션을 새로 열고 닫으므로, 느린 클라이언트에 보내는 동안에는 DB 커넥션을 잡고 있지 않습니다.
+    build_query(last_key): 마지막 키 이후의 정렬된 SELECT, next_key(row): 다음 배치의 기준 키
+    """
+    last_key = None
+    while True:
+        stmt = (
+            build_query(last_key)
+            .limit(EXPORT_BATCH_SIZE)
+            # 내보내기 쿼리는 DB_STATEMENT_TIMEOUT_MS(세션 max_execution_time) 적용 대상에서 제외
+            .prefix_with("/*+ MAX_EXECUTION_TIME(0) */", dialect="mysql")
+        )
+        async with get_async_db_session() as db_session:
+            rows = (await db_session.execute(stmt)).all()
+        for row in rows:
+            yield row
+        if len(rows) < EXPORT_BATCH_SIZE:
+            return
+        last_key = next_key(rows[-1])
+
+
+def _diary_rows(user_id: str):
+    # 사용자당 날짜는 유일하므로 date 를 keyset 키로 사용 (uq_diaryentry_user_date)
+    def build_query(last_date):
+        stmt = (
+            select(
+                DiaryEntry.id, DiaryEntry.date, DiaryEntry.content, DiaryEntry.mood,
+                DiaryEntry.created_at, DiaryEntry.updated_at
+            )
+            .where(DiaryEntry.user_id == user_id)
+            .order_by(DiaryEntry.date)
+        )
+        if last_date is not None:
+            stmt = stmt.where(DiaryEntry.date > last_date)
+        return stmt
+    return _iter_batches(build_query, lambda row: row.date)
+
+
+def _after(diary_id_column, id_column, last_key):
+    """(diary_id, id) 순서에서 last_key 다음 행 조건"""
+    last_diary_id, last_id = last_key
+    return or_(diary_id_column > last_diary_id, and_(diary_id_column == last_diary_id, id_column > last_id))
+
+
+def _photo_rows(user_id: str):
+    def build_query(last_key):
+        stmt = (
+            select(
+                Photo.id, Photo.diary_id, Photo.path, Photo.thumbnail_path, Photo.preview_path,
+                Photo.description, Photo.description_status, Photo.created_at
+            )
+            .join(DiaryEntry, Photo.diary_id == DiaryEntry.id)
+            .where(DiaryEntry.user_id == user_id)
+            .order_by(Photo.diary_id, Photo.id)
+        )
+        if last_key is not None:
+            stmt = stmt.where(_after(Photo.diary_id, Photo.id, last_key))
+        return stmt
+    return _iter_batches(build_query, lambda row: (row.diary_id, row.id))
+
+
+def _ai_log_rows(user_id: str):
+    def build_query(last_key):
+        stmt = (
+            select(AIQueryLog.id, AIQueryLog.diary_id, AIQueryLog.written_by, AIQueryLog.content, AIQueryLog.created_at)
+            .join(DiaryEntry, AIQueryLog.diary_id == DiaryEntry.id)
+            .where(DiaryEntry.user_id == user_id)
+            .order_by(AIQueryLog.diary_id, AIQueryLog.id)
+        )
+        if last_key is not None:
+            stmt = stmt.where(_after(AIQueryLog.diary_id, AIQueryLog.id, last_key))
+        return stmt
+    return _iter_batches(build_query, lambda row: (row.diary_id, row.id))
+
+
+def _photo_paths(user_id: str):
+    # 같은 내용의 사진은 파일 하나를 공유하므로 경로 기준으로 중복 없이 조회
+    def build_query(last_path):
+        stmt = (
+            select(Photo.path)
+            .distinct()
+            .join(DiaryEntry, Photo.diary_id == DiaryEntry.id)
+            .where(DiaryEntry.user_id == user_id, Photo.path.is_not(None))
+            .order_by(Photo.path)
+        )
+        if last_path is not None:
+            stmt = stmt.where(Photo.path > last_path)
+        return stmt
+    return _iter_batches(build_query, lambda row: row.path)
+
+
+async def iter_export_records(user_id: str, with_files: bool = False):
+    """
+    사용자의 일기, 사진, AI 대화를 한 줄에 하나씩 내보낼 레코드로 만듭니다.
+    테이블마다 keyset 배치로 나눠 읽으므로 기간과 관계없이 메모리 사용량이 일정합니다.
+    with_files: 사진 레코드에 ZIP 안의 파일 경로(file)를 포함
+    """
+    async for row in _diary_rows(user_id):
+        yield {
+            "type": "diary",
+            "id": row.id,
+            "date": _isoformat(row.date),
+            "content": row.content,
+            "mood": row.mood,
+            "created_at": _isoformat(row.created_at),
+            "updated_at": _isoformat(row.updated_at),
+        }
+
+    async for row in _photo_rows(user_id):
+        record = {
+            "type": "photo",
+            "id": row.id,
+            "diary_id": row.diary_id,
+            "path": row.path,
+            "thumbnail_path": row.thumbnail_path,
+            "preview_path": row.preview_path,
+            "description": row.description,
+            "description_status": row.description_status,
+            "created_at": _isoformat(row.created_at),
+        }
+        if with_files and row.path:
+            record["file"] = f"photos/{os.path.basename(row.path)}"
+        yield record
+
+    async for row in _ai_log_rows(user_id):
+        yield {
+            "type": "ai_log",
+            "id": row.id,
+            "diary_id": row.diary_id,
+            "written_by": row.written_by,
+            "content": row.content,
+            "created_at": _isoformat(row.created_at),
+        }
+
+
+async def iter_ndjson_lines(user_id: str, with_files: bool = False):
+    """레코드를 NDJSON 으로 인코딩해 EXPORT_CHUNK_BYTES 단위로 묶어 반환합니다."""
+    buffer = []
+    size = 0
+    async for record in iter_export_records(user_id, with_files):
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        buffer.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield b"".join(buffer)
+            buffer.clear()
+            size = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+# 스트리밍 응답용 NDJSON 내보내기 (DB 세션은 배치마다 서비스 안에서 직접 열고 닫음)
+async def stream_ndjson_export(user_id: str):
+    async for chunk in iter_ndjson_lines(user_id):
+        yield chunk
+
+
+class _ZipChunkStream:
+    """ZipFile 이 쓴 바이트를 모아 두었다가 응답 청크로 꺼내는 쓰기 전용 스트림 (seek 불가 → 데이터 디스크립터 사용)"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+# 스트리밍 응답용 ZIP 내보내기: NDJSON + 사진 원본 파일(photos/)
+async def stream_zip_export(user_id: str):
+    stream = _ZipChunkStream()
+    with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        # 크기를 미리 알 수 없으므로 ZIP64 로 기록
+        with archive.open(EXPORT_NDJSON_NAME, "w", force_zip64=True) as entry:
+            async for chunk in iter_ndjson_lines(user_id, with_files=True):
+                entry.write(chunk)
+                if data := stream.drain():
+                    yield data
+
+        # 경로 배치 조회가 끝난 뒤 파일을 보내므로 파일 전송 중에는 DB 커넥션을 잡지 않음
+        async for row in _photo_paths(user_id):
+            file_path = photo_file_path(row.path)
+            if not os.path.exists(file_path):
+                print(f"내보내기: 사진 파일 없음 {os.path.basename(file_path)}")
+                continue
+            # 사진은 이미 압축된 형식이므로 그대로 저장
+            info = zipfile.ZipInfo(f"photos/{os.path.basename(row.path)}")
+            info.compress_type = zipfile.ZIP_STORED
+            info.file_size = os.path.getsize(file_path)
+            with archive.open(info, "w", force_zip64=True) as entry:
+                async with await anyio.open_file(file_path, "rb") as source:
+                    while chunk := await source.read(EXPORT_CHUNK_BYTES):
+                        entry.write(chunk)
+                        if data := stream.drain():
+                            yield data
+            if data := stream.drain():
+                yield data
+    # 중앙 디렉터리 (ZipFile 을 닫을 때 기록됨)
+    yield stream.drain()
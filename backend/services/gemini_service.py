@@ -1,108 +1,176 @@
+import asyncio
+import hashlib
 import os
+import httpx
 from dotenv import load_dotenv
-from PIL import Image
-import io
-from fastapi import UploadFile
 from google import genai
+from google.genai import types
+from backend.dependencies.db import get_async_db_session
+from backend.services.description_cache_service import get_cached_description, store_description
+from backend.services.image_service import compress_image_for_gemini, run_image_task
 
 load_dotenv()
 
-# Gemini API 키 설정
-GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+# Gemini API 키 설정 (genai.Client() 기본값과 같이 GOOGLE_API_KEY 도 허용)
+GEMINI_API_KEY = os.getenv('GEMINI_API_KEY') or os.getenv('GOOGLE_API_KEY')
 
-def get_gemini_model():
-    """Gemini Pro Vision 모델을 반환합니다."""
-    try:
+# Gemini HTTP 커넥션 풀 (keep-alive + HTTP/2 로 TLS 핸드셰이크 재사용)
+GEMINI_MAX_CONNECTIONS = int(os.getenv('GEMINI_MAX_CONNECTIONS', '20'))
+GEMINI_KEEPALIVE_SECONDS = float(os.getenv('GEMINI_KEEPALIVE_SECONDS', '120'))
+
+# 사용할 모델 / 호출별 최대 대기 시간 (초) - 넘으면 asyncio.TimeoutError
+GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
+GEMINI_CHAT_TIMEOUT_SECONDS = float(os.getenv('GEMINI_CHAT_TIMEOUT_SECONDS', '30'))
+GEMINI_PHOTO_TIMEOUT_SECONDS = float(os.getenv('GEMINI_PHOTO_TIMEOUT_SECONDS', '60'))
+
+# 설명을 만들 수 없을 때 사용하는 기본 문구
+DEFAULT_PHOTO_DESCRIPTION = "사진이 포함된 일기입니다."
+
+# 프로세스 전체에서 공유하는 Gemini 클라이언트 (lifespan / 워커 시작 시 생성)
+_gemini_client = None
+
+
+def _http_client_args() -> dict:
+    return {
+        "http2": True,
+        "limits": httpx.Limits(
+            max_connections=GEMINI_MAX_CONNECTIONS,
+            max_keepalive_connections=GEMINI_MAX_CONNECTIONS,
+            keepalive_expiry=GEMINI_KEEPALIVE_SECONDS
+        ),
+    }
+
+
+def init_gemini_client():
+    """공유 Gemini 클라이언트를 생성합니다. (이미 있으면 그대로 반환)"""
+    global _gemini_client
+    if _gemini_client is None:
         if not GEMINI_API_KEY:
             print("GEMINI_API_KEY가 설정되지 않았습니다.")
             return None
-        client = genai.Client(api_key=GEMINI_API_KEY)
-        return client
+        _gemini_client = genai.Client(
+            api_key=GEMINI_API_KEY,
+            http_options=types.HttpOptions(
+                client_args=_http_client_args(),
+                async_client_args=_http_client_args()
+            )
+        )
+        print("Gemini 클라이언트 초기화 완료")
+    return _gemini_client
+
+
+def get_gemini_client():
+    """공유 Gemini 클라이언트를 반환합니다."""
+    try:
+        return init_gemini_client()
     except Exception as e:
-        print(f"Gemini 모델 초기화 실패: {e}")
+        print(f"Gemini 클라이언트 초기화 실패: {e}")
         return None
 
-def compress_image_for_gemini(image: Image.Image, max_size: tuple = (1024, 1024), quality: int = 85) -> Image.Image:
-    """
-    Gemini API 전송을 위해 이미지를 압축합니다.
-    
-    Args:
-        image: 원본 PIL Image
-        max_size: 최대 크기 (width, height)
-        quality: JPEG 품질 (1-100)
-        
-    Returns:
-        Image.Image: 압축된 이미지
-    """
+
+async def close_gemini_client():
+    """공유 클라이언트의 HTTP 커넥션을 정리합니다. (SDK 에 close API 가 없어 내부 httpx 클라이언트를 닫음)"""
+    global _gemini_client
+    if _gemini_client is None:
+        return
+    api_client = getattr(_gemini_client, "_api_client", None)
     try:
-        # 이미지 크기 조정 (비율 유지)
-        image.thumbnail(max_size, Image.Resampling.LANCZOS)
-        
-        # JPEG로 변환하여 용량 줄이기
-        output_buffer = io.BytesIO()
-        image.convert('RGB').save(output_buffer, format='JPEG', quality=quality, optimize=True)
-        output_buffer.seek(0)
-        
-        # 압축된 이미지 반환
-        compressed_image = Image.open(output_buffer)
-        
-        # 원본 대비 용량 비교 (디버깅용)
-        original_size = len(image.tobytes())
-        compressed_size = len(compressed_image.tobytes())
-        compression_ratio = (1 - compressed_size / original_size) * 100 if original_size > 0 else 0
-        print(f"이미지 압축: {original_size} → {compressed_size} bytes ({compression_ratio:.1f}% 감소)")
-        
-        return compressed_image
-        
+        if getattr(api_client, "_httpx_client", None):
+            api_client._httpx_client.close()
+        if getattr(api_client, "_async_httpx_client", None):
+            await api_client._async_httpx_client.aclose()
     except Exception as e:
-        print(f"이미지 압축 실패: {e}")
-        return image
+        print(f"Gemini 클라이언트 종료 실패: {e}")
+    _gemini_client = None
 
-async def analyze_photo_and_generate_description(photo: UploadFile) -> str:
+async def generate_content_async(contents, config=None, timeout: float = GEMINI_CHAT_TIMEOUT_SECONDS):
+    """
+    Gemini 비동기 API(client.aio)로 콘텐츠를 생성합니다.
+    이벤트 루프를 막지 않으며, timeout 초 안에 끝나지 않으면 asyncio.TimeoutError 를 올립니다.
     """
-    사진을 분석하고 일기용 설명을 생성합니다.
+    client = get_gemini_client()
+    if client is None:
+        raise RuntimeError("GEMINI_API_KEY가 설정되지 않았습니다.")
+    return await asyncio.wait_for(
+        client.aio.models.generate_content(model=GEMINI_MODEL, contents=contents, config=config),
+        timeout=timeout
+    )
+
+
+async def stream_content_async(contents, config=None, timeout: float = GEMINI_CHAT_TIMEOUT_SECONDS):
+    """
+    Gemini 스트리밍 API로 생성되는 텍스트 조각을 순서대로 내보냅니다. (async generator)
+    timeout 은 전체 생성에 대한 마감 시간이며, 넘으면 asyncio.TimeoutError 를 올립니다.
+    """
+    client = get_gemini_client()
+    if client is None:
+        raise RuntimeError("GEMINI_API_KEY가 설정되지 않았습니다.")
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+
+    def remaining():
+        left = deadline - loop.time()
+        if left <= 0:
+            raise asyncio.TimeoutError()
+        return left
+
+    stream = await asyncio.wait_for(
+        client.aio.models.generate_content_stream(model=GEMINI_MODEL, contents=contents, config=config),
+        timeout=remaining()
+    )
+    while True:
+        try:
+            chunk = await asyncio.wait_for(stream.__anext__(), timeout=remaining())
+        except StopAsyncIteration:
+            break
+        if chunk.text:
+            yield chunk.text
+
+
+async def analyze_photo_and_generate_description(file_path: str) -> str:
+    """
+    저장된 사진 파일을 분석하고 일기용 설명을 생성합니다.
+    Gemini 호출이 실패하면 예외를 그대로 올려 작업 큐에서 재시도할 수 있도록 합니다.
     
     Args:
-        photo: 업로드된 사진 파일
+        file_path: 서버에 저장된 사진 파일 경로
         
     Returns:
         str: 사진에 대한 일기용 설명
     """
-    try:
-        # Gemini API 키가 없으면 기본 설명 반환
-        if not GEMINI_API_KEY:
-            return "사진이 포함된 일기입니다."
-        
-        model = get_gemini_model()
-        if not model:
-            return "사진이 포함된 일기입니다."
-        
-        # 사진 파일을 PIL Image로 변환
-        image_data = await photo.read()
-        original_image = Image.open(io.BytesIO(image_data))
-        
-        # 이미지 압축 (Gemini API 전송용)
-        compressed_image = compress_image_for_gemini(original_image)
-        
-        # Gemini에 전송할 프롬프트
-        prompt = """
-        이 사진을 보고 사진을 설명할 수 있는 한국어 2-3문장으로 작성해주세요.
-        사용자가 무엇을 하였을지 추측하는데 도움이 되도록 작성하시오.
-        """
-        
-        # Gemini API 호출 (압축된 이미지 사용)
-        response = model.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=[prompt, compressed_image]
-        )
-        
-        if response.text:
-            return response.text.strip()
-        else:
-            return "사진이 포함된 일기입니다."
-            
-    except Exception as e:
-        print(f"사진 분석 실패: {e}")
-        print(f"GEMINI_API_KEY 설정 여부: {GEMINI_API_KEY is not None}")
-        print(f"모델 초기화 여부: {model is not None}")
-        return "사진이 포함된 일기입니다." 
\ No newline at end of file
+    # Gemini API 키가 없으면 기본 설명 반환
+    if not GEMINI_API_KEY:
+        return DEFAULT_PHOTO_DESCRIPTION
+    
+    if not get_gemini_client():
+        return DEFAULT_PHOTO_DESCRIPTION
+    
+    # 사진 압축 (Gemini API 전송용) - 프로세스 풀에서 JPEG 바이트로 인코딩
+    compressed_image = await run_image_task(compress_image_for_gemini, file_path)
+    
+    # 같은 이미지(정규화 후 동일한 바이트)의 설명이 캐시에 있으면 Gemini 호출 생략
+    image_hash = hashlib.sha256(compressed_image).hexdigest()
+    async with get_async_db_session() as db_session:
+        cached = await get_cached_description(db_session, image_hash)
+    if cached:
+        print(f"사진 설명 캐시 적중: {image_hash[:12]}")
+        return cached
+    
+    # Gemini에 전송할 프롬프트
+    prompt = """
+    이 사진을 보고 사진을 설명할 수 있는 한국어 2-3문장으로 작성해주세요.
+    사용자가 무엇을 하였을지 추측하는데 도움이 되도록 작성하시오.
+    """
+    
+    # Gemini API 비동기 호출 (압축된 이미지 사용)
+    response = await generate_content_async(
+        [prompt, types.Part.from_bytes(data=compressed_image, mime_type="image/jpeg")],
+        timeout=GEMINI_PHOTO_TIMEOUT_SECONDS
+    )
+    
+    if response.text:
+        description = response.text.strip()
+        async with get_async_db_session() as db_session:
+            await store_description(db_session, image_hash, description)
+        return description
+    return DEFAULT_PHOTO_DESCRIPTION
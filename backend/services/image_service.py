@@ -0,0 +1,130 @@
+import asyncio
+import io
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageOps
+
+# 업로드 시 함께 만드는 축소본 크기 (긴 변 기준 px)
+THUMBNAIL_SIZE = 128  # 달력 타일용
+PREVIEW_SIZE = 512    # 상세 화면용
+DERIVATIVE_QUALITY = 80
+
+# 이미지 처리 프로세스 수 / 허용 최대 픽셀 수 (디코딩 전에 헤더로 확인)
+IMAGE_PROCESS_WORKERS = int(os.getenv('IMAGE_PROCESS_WORKERS', '2'))
+MAX_IMAGE_PIXELS = int(os.getenv('MAX_IMAGE_PIXELS', str(50_000_000)))
+
+# Pillow 자체의 decompression bomb 검사도 같은 기준으로 맞춤 (자식 프로세스에도 적용)
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+
+class ImageTooLargeError(ValueError):
+    """이미지 픽셀 수가 MAX_IMAGE_PIXELS 를 넘는 경우"""
+
+
+_executor = None
+
+
+def get_image_executor() -> ProcessPoolExecutor:
+    """이미지 디코딩/리사이즈는 CPU 작업이므로 이벤트 루프 밖의 프로세스 풀에서 실행합니다."""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=IMAGE_PROCESS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+def shutdown_image_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def run_image_task(func, *args):
+    """프로세스 풀에서 이미지 작업을 실행하고 결과를 기다립니다."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_image_executor(), func, *args)
+
+
+def open_image(src_path: str, target_size: int) -> Image.Image:
+    """
+    픽셀 수를 확인한 뒤 이미지를 엽니다.
+    JPEG 는 draft 모드로 target_size 근처까지만 DCT 축소 디코딩하여 시간/메모리를 줄입니다.
+    """
+    try:
+        image = Image.open(src_path)
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(str(e))
+    width, height = image.size
+    if width * height > MAX_IMAGE_PIXELS:
+        image.close()
+        raise ImageTooLargeError(f"이미지 해상도가 너무 큽니다. ({width}x{height})")
+    image.draft("RGB", (target_size, target_size))
+    return image
+
+
+def derivative_url(url_path: str, size: int) -> str:
+    """원본 URL 경로에 대응하는 축소본 URL 경로 (예: /resources/photos/abc.jpg → abc_128.jpg)"""
+    stem, _ = os.path.splitext(url_path)
+    return f"{stem}_{size}.jpg"
+
+
+def make_derivatives(src_path: str, targets: list):
+    """
+    원본을 한 번만 디코딩해서 여러 크기의 JPEG 축소본을 만듭니다. (프로세스 풀에서 실행)
+    targets: (저장 경로, 크기) 목록
+    """
+    largest = max(size for _, size in targets)
+    with open_image(src_path, largest) as image:
+        # 휴대폰 사진의 EXIF 회전 정보를 반영 (축소본에는 EXIF 를 남기지 않음)
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        for dst_path, size in sorted(targets, key=lambda target: -target[1]):
+            image.thumbnail((size, size), Image.Resampling.LANCZOS)
+            # 같은 사진을 동시에 처리해도 서로의 임시 파일을 덮어쓰지 않도록 고유한 이름 사용
+            tmp_path = f"{dst_path}.{uuid.uuid4().hex}.part"
+            image.save(tmp_path, format="JPEG", quality=DERIVATIVE_QUALITY)
+            os.replace(tmp_path, dst_path)
+
+
+def compress_image_for_gemini(src_path: str, max_size: int = 1024, quality: int = 85) -> bytes:
+    """
+    Gemini API 전송용으로 이미지를 줄여 JPEG 바이트로 반환합니다. (프로세스 풀에서 실행)
+    인코딩된 바이트를 그대로 전송하므로 다시 디코딩하지 않습니다.
+    """
+    with open_image(src_path, max_size) as image:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+        output_buffer = io.BytesIO()
+        image.save(output_buffer, format="JPEG", quality=quality)
+    return output_buffer.getvalue()
+
+
+async def create_photo_derivatives(file_path: str, url_path: str) -> dict:
+    """
+    달력/상세 화면용 축소본을 원본 옆에 생성합니다. (이미 있으면 그대로 사용)
+    반환: {"thumbnail_path": URL, "preview_path": URL} - 만들 수 없으면 None
+    해상도가 MAX_IMAGE_PIXELS 를 넘으면 ImageTooLargeError 를 올립니다.
+    """
+    urls = {
+        "thumbnail_path": derivative_url(url_path, THUMBNAIL_SIZE),
+        "preview_path": derivative_url(url_path, PREVIEW_SIZE),
+    }
+    targets = []
+    for url, size in ((urls["thumbnail_path"], THUMBNAIL_SIZE), (urls["preview_path"], PREVIEW_SIZE)):
+        dst_path = os.path.join(os.path.dirname(file_path), os.path.basename(url))
+        if not os.path.exists(dst_path):
+            targets.append((dst_path, size))
+
+    if targets:
+        try:
+            await run_image_task(make_derivatives, file_path, targets)
+        except ImageTooLargeError:
+            raise
+        except Exception as e:
+            print(f"축소본 생성 실패: {e}")
+            return {"thumbnail_path": None, "preview_path": None}
+    return urls
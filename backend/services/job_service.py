@@ -0,0 +1,130 @@
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, or_, and_
+from backend.models.diary import BackgroundJob
+
+# 실패 시 재시도 간격 (JOB_RETRY_BASE_SECONDS × 2^(시도횟수-1))
+JOB_RETRY_BASE_SECONDS = int(os.getenv('JOB_RETRY_BASE_SECONDS', '10'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '5'))
+# running 상태로 이 시간 이상 남아있으면 워커가 죽은 것으로 보고 다시 가져감 (초)
+JOB_LOCK_TIMEOUT_SECONDS = int(os.getenv('JOB_LOCK_TIMEOUT_SECONDS', '300'))
+# 완료(done)된 작업 행을 보관하는 기간 (일) / 한 번에 삭제하는 행 수
+JOB_RETENTION_DAYS = int(os.getenv('JOB_RETENTION_DAYS', '7'))
+JOB_PURGE_BATCH_SIZE = 1000
+
+
+class JobDeferred(Exception):
+    """작업을 아직 처리할 수 없을 때 핸들러가 올리는 예외 (시도 횟수를 쓰지 않고 나중에 다시 실행)"""
+
+    def __init__(self, delay_seconds: int, reason: str = ""):
+        super().__init__(reason)
+        self.delay_seconds = delay_seconds
+
+
+# 작업 등록 (커밋은 호출한 쪽 세션에서 함께 수행)
+def enqueue_job(db, kind: str, target_id: int, delay_seconds: int = 0) -> BackgroundJob:
+    job = BackgroundJob(
+        kind=kind,
+        target_id=target_id,
+        status="pending",
+        max_attempts=JOB_MAX_ATTEMPTS,
+        run_after=datetime.utcnow() + timedelta(seconds=delay_seconds)
+    )
+    db.add(job)
+    return job
+
+
+# 다음 작업 하나를 가져와 running 으로 표시
+async def claim_next_job(db):
+    now = datetime.utcnow()
+    stale_before = now - timedelta(seconds=JOB_LOCK_TIMEOUT_SECONDS)
+
+    # SKIP LOCKED: 여러 워커가 같은 작업을 동시에 가져가지 않도록 함 (MySQL 8.0+)
+    result = await db.execute(
+        select(BackgroundJob)
+        .where(
+            BackgroundJob.run_after <= now,
+            or_(
+                BackgroundJob.status == "pending",
+                and_(BackgroundJob.status == "running", BackgroundJob.locked_at < stale_before)
+            )
+        )
+        .order_by(BackgroundJob.run_after, BackgroundJob.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    job = result.scalars().first()
+    if not job:
+        await db.rollback()
+        return None
+
+    job.status = "running"
+    job.locked_at = now
+    job.attempts += 1
+    await db.commit()
+    return job
+
+
+# 작업 성공 처리
+async def complete_job(db, job: BackgroundJob):
+    job.status = "done"
+    job.locked_at = None
+    job.last_error = None
+    # 완료 시각을 run_after 에 기록해 보관 기간 정리가 (status, run_after) 인덱스를 사용하도록 함
+    job.run_after = datetime.utcnow()
+    await db.commit()
+
+
+# 작업 실패 처리 (남은 시도가 있으면 지수 백오프로 재예약)
+async def fail_job(db, job: BackgroundJob, error: str) -> bool:
+    job.last_error = error[:2000]
+    job.locked_at = None
+    retry = job.attempts < job.max_attempts
+    if retry:
+        job.status = "pending"
+        job.run_after = datetime.utcnow() + timedelta(
+            seconds=JOB_RETRY_BASE_SECONDS * (2 ** (job.attempts - 1))
+        )
+    else:
+        job.status = "failed"
+    await db.commit()
+    return retry
+
+
+# 작업 연기 (재시도가 아니므로 시도 횟수를 되돌림)
+async def defer_job(db, job: BackgroundJob, delay_seconds: int):
+    job.status = "pending"
+    job.locked_at = None
+    job.attempts = max(job.attempts - 1, 0)
+    job.run_after = datetime.utcnow() + timedelta(seconds=delay_seconds)
+    await db.commit()
+
+
+# 특정 대상의 최신 작업 조회 (상태 폴링용)
+async def get_latest_job(db, kind: str, target_id: int):
+    result = await db.execute(
+        select(BackgroundJob)
+        .where(BackgroundJob.kind == kind, BackgroundJob.target_id == target_id)
+        .order_by(BackgroundJob.id.desc())
+        .limit(1)
+    )
+    return result.scalars().first()
+
+
+# 보관 기간이 지난 완료 작업 삭제 (실패한 작업은 확인용으로 남김)
+async def purge_finished_jobs(db, retention_days: int = JOB_RETENTION_DAYS) -> int:
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    purged = 0
+    while True:
+        # MySQL 은 IN 서브쿼리에 LIMIT 을 쓸 수 없으므로 id 를 먼저 조회 (status, run_after 인덱스 사용)
+        ids = (await db.execute(
+            select(BackgroundJob.id)
+            .where(BackgroundJob.status == "done", BackgroundJob.run_after < cutoff)
+            .limit(JOB_PURGE_BATCH_SIZE)
+        )).scalars().all()
+        if not ids:
+            await db.rollback()
+            return purged
+        await db.execute(delete(BackgroundJob).where(BackgroundJob.id.in_(ids)))
+        await db.commit()
+        purged += len(ids)
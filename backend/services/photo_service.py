@@ -1,74 +1,342 @@
+import asyncio
+import hashlib
 import os
 import shutil
 import uuid
+from functools import partial
+import anyio
 from fastapi import UploadFile
-from backend.services.gemini_service import analyze_photo_and_generate_description
-from backend.dependencies.db import get_db_session
+from backend.services.gemini_service import analyze_photo_and_generate_description, DEFAULT_PHOTO_DESCRIPTION
+from backend.services.job_service import enqueue_job
+from backend.services.calendar_service import invalidate_month_for_diary
+from backend.services.image_service import create_photo_derivatives, derivative_url, ImageTooLargeError, THUMBNAIL_SIZE, PREVIEW_SIZE
+from backend.dependencies.db import get_async_db_session, add_after_commit_hook, run_after_commit_hooks
 from backend.models.diary import Photo
-from io import BytesIO
+from sqlalchemy import select, case
 
-def delete_photo_by_id(diary_id: int, photo_id: int, db):
-    db_session = get_db_session()
-    try:
-        photo = db_session.query(Photo).filter(
+# 사진 설명 생성 작업 종류 (BackgroundJob.kind)
+PHOTO_DESCRIPTION_JOB = "photo_description"
+# 축소본이 없는 기존 사진의 128/512px 축소본 생성 작업 종류 (마이그레이션 0010 이 등록)
+PHOTO_DERIVATIVES_JOB = "photo_derivatives"
+
+PHOTOS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "resources", "photos")
+# 저장 파일 확장자 (원본 파일명은 <해시><확장자>)
+PHOTO_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic", ".heif")
+
+# 여러 장 업로드 시 동시 처리 개수 (요청당 / 워커 프로세스 전체)
+PHOTO_UPLOAD_CONCURRENCY_PER_REQUEST = int(os.getenv('PHOTO_UPLOAD_CONCURRENCY_PER_REQUEST', '4'))
+PHOTO_UPLOAD_CONCURRENCY_PER_WORKER = int(os.getenv('PHOTO_UPLOAD_CONCURRENCY_PER_WORKER', '16'))
+_worker_upload_slots = asyncio.Semaphore(PHOTO_UPLOAD_CONCURRENCY_PER_WORKER)
+
+# 업로드 최대 크기 (바이트) / 디스크에 쓰는 청크 크기
+MAX_PHOTO_BYTES = int(os.getenv('MAX_PHOTO_BYTES', str(20 * 1024 * 1024)))
+PHOTO_UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# 커밋 후 정리할 사진 파일 목록을 세션(db.info)에 모아 두는 키
+_RELEASED_PHOTOS = "released_photos"
+
+
+class PhotoTooLargeError(ValueError):
+    """업로드된 사진이 MAX_PHOTO_BYTES 를 넘거나 해상도가 MAX_IMAGE_PIXELS 를 넘는 경우"""
+
+
+def photo_file_path(url_path: str) -> str:
+    """DB에 저장된 URL 경로(/resources/photos/...)를 실제 파일 경로로 변환합니다."""
+    return os.path.join(PHOTOS_DIR, os.path.basename(url_path))
+
+
+def photo_extension(filename: str) -> str:
+    """업로드 파일명에서 저장용 확장자를 고릅니다. (알 수 없으면 .jpg)"""
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext in PHOTO_EXTENSIONS:
+        return ext
+    return ".jpg"
+
+
+async def remove_unreferenced_photo_files(photos: list):
+    """
+    삭제가 커밋된 뒤 호출합니다. 더 이상 어떤 Photo 행도 참조하지 않는 사진 파일(원본/축소본)을 삭제합니다.
+    photos: (content_hash, url_path) 목록. 해시가 없는 기존 사진 파일은 그대로 둡니다.
+    해시별로 짧은 세션에서 Photo 행(없으면 인덱스 범위)을 FOR UPDATE 로 잠근 채 참조를 다시 세므로,
+    그 사이 같은 파일을 재사용한 업로드의 행은 커밋을 기다려 반영되고, 잠금 중 추가되는 행은 삭제가 끝난 뒤에 들어갑니다.
+    """
+    for content_hash, url_path in set(photos):
+        if not content_hash:
+            continue
+        try:
+            async with get_async_db_session() as db_session:
+                referenced = (await db_session.execute(
+                    select(Photo.id).where(Photo.content_hash == content_hash).limit(1).with_for_update()
+                )).first()
+                if referenced is None:
+                    remove_photo_files([url_path])
+                await db_session.commit()
+        except Exception as e:
+            # 파일 정리는 삭제 커밋 이후의 부가 작업이므로 실패해도 삭제 결과에는 영향 없음
+            print(f"❌ 사진 파일 정리 실패: {os.path.basename(url_path)} ({e})")
+
+
+async def flush_released_photos(db):
+    """세션에 모인 삭제된 사진의 파일을 정리합니다. (삭제 트랜잭션이 커밋된 뒤 실행)"""
+    await remove_unreferenced_photo_files(db.info.pop(_RELEASED_PHOTOS, []))
+
+
+# 사진 행 삭제 시 파일 정리를 커밋 후 작업으로 등록 (롤백되면 파일은 그대로 남음)
+def release_photo_files(db, photos: list):
+    """photos: (content_hash, url_path) 목록"""
+    db.info.setdefault(_RELEASED_PHOTOS, []).extend(photos)
+    add_after_commit_hook(db, "photo_files", partial(flush_released_photos, db))
+
+
+def remove_photo_files(url_paths: list):
+    """원본과 축소본 파일을 삭제합니다. (커밋이 끝난 뒤 호출)"""
+    for url_path in url_paths:
+        for path in (url_path, derivative_url(url_path, THUMBNAIL_SIZE), derivative_url(url_path, PREVIEW_SIZE)):
+            file_path = photo_file_path(path)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+                print(f"참조가 없는 사진 파일 삭제: {os.path.basename(file_path)}")
+
+
+async def get_photo(diary_id: int, photo_id: int, db):
+    result = await db.execute(
+        select(Photo).where(
             Photo.id == photo_id,
             Photo.diary_id == diary_id
-        ).first()
-        
-        if photo:
-            db_session.delete(photo)
-            db_session.commit()
-            return True
-        return False
-    except Exception as e:
-        print(f"❌ 사진 삭제 실패: {e}")
-        db_session.rollback()
+        )
+    )
+    return result.scalars().first()
+
+async def delete_photo_by_id(diary_id: int, photo_id: int, db):
+    """사진 행을 삭제합니다. (커밋은 요청 단위 세션에서, 파일은 커밋이 확정된 뒤에 정리)"""
+    photo = await get_photo(diary_id, photo_id, db)
+    if not photo:
         return False
-    finally:
-        db_session.close()
 
-async def upload_photo_with_description(diary_id: int, photo: UploadFile, db):
-    # 1. 파일 저장
-    filename = f"{uuid.uuid4().hex}_{photo.filename}"
-    photos_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "resources", "photos")
-    os.makedirs(photos_dir, exist_ok=True)  # 디렉토리가 없으면 생성
-    file_path = os.path.join(photos_dir, filename)
-    url_path = f"/resources/photos/{filename}"  # 웹 접근용 URL 경로
-    
-    # 파일을 메모리에 복사 (Gemini API 분석용)
-    photo_data = await photo.read()
-    
-    # 파일 저장
-    with open(file_path, "wb") as buffer:
-        buffer.write(photo_data)
-    
-    # 2. Gemini API로 사진 설명 요청
-    try:
-        # UploadFile 객체를 다시 생성 (분석용)
-        photo_for_analysis = UploadFile(
-            filename=photo.filename,
-            file=BytesIO(photo_data)
-        )
-        photo_description = await analyze_photo_and_generate_description(photo_for_analysis)
-    except Exception as e:
-        print(f"Gemini API 분석 실패: {e}")
-        photo_description = "사진이 포함된 일기입니다."
+    await db.delete(photo)
+    # 첫 사진이면 달력 썸네일이 바뀌므로 해당 월 캐시 무효화
+    await invalidate_month_for_diary(db, diary_id)
+    release_photo_files(db, [(photo.content_hash, photo.path)])
+    await db.flush()
+    return True
+
 
-    # 3. DB에 저장 (URL 경로 저장)
-    db_session = get_db_session()
+async def save_upload_to_disk(photo: UploadFile, file_path: str):
+    """
+    업로드 파일을 청크 단위로 디스크에 저장합니다. (메모리에 전체를 올리지 않음)
+    저장하면서 SHA-256 해시와 크기를 계산하고, MAX_PHOTO_BYTES 를 넘으면 중단합니다.
+    반환: (sha256 hex, 바이트 수)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    tmp_path = f"{file_path}.part"
     try:
-        photo = Photo(
-            diary_id=diary_id,
-            path=url_path,
-            description=photo_description
-        )
-        db_session.add(photo)
-        db_session.commit()
-        db_session.refresh(photo)
-        return photo.id, url_path, photo_description
-    except Exception as e:
-        print(f"❌ 사진 DB 저장 실패: {e}")
-        db_session.rollback()
+        async with await anyio.open_file(tmp_path, "wb") as buffer:
+            while chunk := await photo.read(PHOTO_UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_PHOTO_BYTES:
+                    raise PhotoTooLargeError(
+                        f"사진 용량이 너무 큽니다. (최대 {MAX_PHOTO_BYTES // (1024 * 1024)}MB)"
+                    )
+                digest.update(chunk)
+                await buffer.write(chunk)
+        if size == 0:
+            raise ValueError("빈 파일은 업로드할 수 없습니다.")
+        # 다 쓴 뒤에만 최종 경로로 이동 (중간에 실패한 파일이 노출되지 않도록)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
         raise
+    return digest.hexdigest(), size
+
+def find_stored_photo(content_hash: str):
+    """같은 내용으로 이미 저장된 원본 파일명을 찾습니다. (파일명이 <해시><확장자> 이므로 확장자별 존재 여부만 확인)"""
+    for ext in PHOTO_EXTENSIONS:
+        filename = f"{content_hash}{ext}"
+        if os.path.exists(os.path.join(PHOTOS_DIR, filename)):
+            return filename
+    return None
+
+
+async def store_photo_file(photo: UploadFile) -> dict:
+    """
+    사진 파일을 내용 해시(SHA-256) 기준으로 저장하고 128/512px 축소본을 만듭니다. (DB 를 사용하지 않음)
+    같은 내용의 파일이 이미 있으면 그 파일과 축소본을 그대로 사용합니다.
+    반환: {"content_hash", "url_path", "thumbnail_path", "preview_path"}
+    """
+    # 1. 임시 파일로 저장 (청크 스트리밍, 크기 제한) - 해시는 다 받은 뒤에 알 수 있음
+    os.makedirs(PHOTOS_DIR, exist_ok=True)  # 디렉토리가 없으면 생성
+    tmp_path = os.path.join(PHOTOS_DIR, f"{uuid.uuid4().hex}.upload")
+    content_hash, file_size = await save_upload_to_disk(photo, tmp_path)
+
+    stored_filename = find_stored_photo(content_hash)
+    filename = stored_filename or f"{content_hash}{photo_extension(photo.filename)}"
+    url_path = f"/resources/photos/{filename}"  # 웹 접근용 URL 경로
+    file_path = photo_file_path(url_path)
+
+    try:
+        # 2. 파일 배치: 같은 내용의 파일이 이미 있으면 임시 파일만 삭제
+        if stored_filename:
+            os.remove(tmp_path)
+            print(f"중복 사진 - 기존 파일 재사용: {filename}")
+        else:
+            os.replace(tmp_path, file_path)
+            print(f"사진 저장 완료: {filename} ({file_size} bytes)")
+
+        # 3. 달력/상세 화면용 축소본 (이미 있는 축소본은 재사용)
+        derivatives = await create_photo_derivatives(file_path, url_path)
+    except ImageTooLargeError as e:
+        if not stored_filename and os.path.exists(file_path):
+            os.remove(file_path)
+        raise PhotoTooLargeError(str(e))
     finally:
-        db_session.close()
\ No newline at end of file
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return {"content_hash": content_hash, "url_path": url_path, **derivatives}
+
+
+async def insert_photo(diary_id: int, stored: dict, db):
+    """
+    저장된 파일로 Photo 행을 추가하고 설명 생성 작업을 등록합니다. (커밋은 요청 단위 세션에서)
+    같은 내용의 사진 설명이 완료되어 있으면 그대로 재사용하고 작업을 등록하지 않습니다.
+    """
+    # 같은 내용의 기존 사진 조회 (설명이 완료된 것 우선)
+    result = await db.execute(
+        select(Photo.description, Photo.description_status)
+        .where(Photo.content_hash == stored["content_hash"])
+        .order_by(case((Photo.description_status == "done", 0), else_=1), Photo.id)
+        .limit(1)
+    )
+    existing = result.first()
+    reuse_description = existing is not None and existing.description_status == "done"
+
+    photo = Photo(
+        diary_id=diary_id,
+        path=stored["url_path"],
+        content_hash=stored["content_hash"],
+        thumbnail_path=stored["thumbnail_path"],
+        preview_path=stored["preview_path"],
+        description=existing.description if reuse_description else None,
+        description_status="done" if reuse_description else "pending"
+    )
+    db.add(photo)
+    # 첫 사진이면 달력 썸네일이 바뀌므로 해당 월 캐시 무효화
+    await invalidate_month_for_diary(db, diary_id)
+    await db.flush()
+    # 재사용한 파일을 다른 요청이 방금 정리했으면 (삭제 쪽 잠금이 끝난 뒤 INSERT 가 진행된 경우) 이 사진은 실패 처리
+    if not os.path.exists(photo_file_path(stored["url_path"])):
+        raise FileNotFoundError("사진 파일이 동시에 삭제되었습니다. 다시 업로드해주세요.")
+    if not reuse_description:
+        enqueue_job(db, PHOTO_DESCRIPTION_JOB, photo.id)
+    return photo.id, photo.path, photo.description, photo.description_status
+
+
+async def upload_photo_with_description(diary_id: int, photo: UploadFile, db):
+    """
+    사진을 내용 해시 기준으로 저장하고(128/512px 축소본 포함) Gemini 설명 생성 작업을 큐에 등록합니다.
+    같은 내용의 사진이 이미 있으면 파일을 한 번만 저장하고, 설명이 완료된 경우 그대로 재사용합니다.
+    그 외에는 워커(backend/worker.py)가 설명을 채우며, 응답 시점에는 description_status 가 pending 입니다.
+    반환: (photo_id, url_path, description, description_status)
+    """
+    stored = await store_photo_file(photo)
+    return await insert_photo(diary_id, stored, db)
+
+
+async def upload_photos_concurrently(diary_id: int, photos: list, db) -> list:
+    """
+    여러 사진을 업로드합니다. 파일 저장/축소본 생성은 제한된 동시성으로 처리하고,
+    DB 작업은 요청 세션 하나에서 순서대로 수행합니다. (사진마다 savepoint 로 실패를 격리)
+    결과는 입력 순서대로 반환하며, 실패한 사진 자리에는 예외 객체가 들어갑니다.
+    """
+    request_slots = asyncio.Semaphore(PHOTO_UPLOAD_CONCURRENCY_PER_REQUEST)
+
+    async def store_one(photo: UploadFile):
+        async with request_slots, _worker_upload_slots:
+            return await store_photo_file(photo)
+
+    stored_photos = await asyncio.gather(*(store_one(photo) for photo in photos), return_exceptions=True)
+
+    results = []
+    for stored in stored_photos:
+        if isinstance(stored, Exception):
+            results.append(stored)
+            continue
+        try:
+            async with db.begin_nested():
+                results.append(await insert_photo(diary_id, stored, db))
+        except Exception as e:
+            print(f"❌ 사진 DB 저장 실패: {e}")
+            results.append(e)
+    return results
+
+
+# 작업 큐 핸들러: Gemini API로 사진 설명 생성
+async def describe_photo(photo_id: int):
+    async with get_async_db_session() as db_session:
+        photo = await db_session.get(Photo, photo_id)
+        if not photo:
+            print(f"사진 {photo_id}가 삭제되어 설명 생성을 건너뜁니다.")
+            return
+        file_path = photo_file_path(photo.path)
+        content_hash = photo.content_hash
+
+        # 그 사이 같은 내용의 사진 설명이 완료되었으면 재사용 (Gemini 호출 생략)
+        photo_description = None
+        if content_hash:
+            photo_description = await db_session.scalar(
+                select(Photo.description).where(
+                    Photo.content_hash == content_hash,
+                    Photo.description_status == "done"
+                ).limit(1)
+            )
+
+    # Gemini 호출 동안에는 DB 커넥션을 잡고 있지 않음
+    if photo_description is None:
+        photo_description = await analyze_photo_and_generate_description(file_path)
+
+    async with get_async_db_session() as db_session:
+        photo = await db_session.get(Photo, photo_id)
+        if photo:
+            photo.description = photo_description
+            photo.description_status = "done"
+            await db_session.commit()
+
+
+# 작업 큐 핸들러: 재시도를 모두 실패한 경우 기본 설명으로 마무리
+async def mark_photo_description_failed(photo_id: int):
+    async with get_async_db_session() as db_session:
+        photo = await db_session.get(Photo, photo_id)
+        if photo:
+            photo.description = DEFAULT_PHOTO_DESCRIPTION
+            photo.description_status = "failed"
+            await db_session.commit()
+
+
+# 작업 큐 핸들러: 축소본 없이 저장된 기존 사진의 축소본 생성
+async def backfill_photo_derivatives(photo_id: int):
+    async with get_async_db_session() as db_session:
+        photo = await db_session.get(Photo, photo_id)
+        if not photo or photo.thumbnail_path or not photo.path:
+            return
+        url_path = photo.path
+
+    # 이미지 처리 동안에는 DB 커넥션을 잡고 있지 않음
+    file_path = photo_file_path(url_path)
+    if not os.path.exists(file_path):
+        print(f"사진 {photo_id} 원본 파일이 없어 축소본 생성을 건너뜁니다.")
+        return
+    derivatives = await create_photo_derivatives(file_path, url_path)
+    if not derivatives["thumbnail_path"]:
+        raise ValueError(f"사진 {photo_id} 축소본 생성 실패")
+
+    async with get_async_db_session() as db_session:
+        photo = await db_session.get(Photo, photo_id)
+        if photo and not photo.thumbnail_path:
+            photo.thumbnail_path = derivatives["thumbnail_path"]
+            photo.preview_path = derivatives["preview_path"]
+            # 달력 썸네일이 축소본으로 바뀌므로 해당 월 캐시 무효화
+            await invalidate_month_for_diary(db_session, photo.diary_id)
+            await db_session.commit()
+            await run_after_commit_hooks(db_session)
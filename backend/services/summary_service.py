@@ -0,0 +1,150 @@
+import os
+from datetime import datetime
+from sqlalchemy import select, func, delete
+from backend.dependencies.db import get_async_db_session
+from backend.models.diary import AIQueryLog, ConversationSummary
+from backend.services.gemini_service import generate_content_async
+from backend.services.job_service import enqueue_job, get_latest_job
+
+# 대화 요약 갱신 작업 종류 (BackgroundJob.kind)
+CONVERSATION_SUMMARY_JOB = "conversation_summary"
+
+# 요약 작업이 접지 않고 원문 그대로 남겨 두는 최근 메시지 수
+AI_RECENT_MESSAGES = int(os.getenv('AI_RECENT_MESSAGES', '8'))
+# 요약되지 않은 메시지가 최근 메시지 수보다 이만큼 많아지면 요약 갱신 작업을 등록
+AI_SUMMARY_BATCH = int(os.getenv('AI_SUMMARY_BATCH', '6'))
+# 요약 한 번에 접어 넣는 최대 메시지 수
+AI_SUMMARY_MAX_FOLD = int(os.getenv('AI_SUMMARY_MAX_FOLD', '40'))
+
+
+def estimate_tokens(text: str) -> int:
+    """토큰 수를 대략 추정합니다. (한글 등 비ASCII 는 글자당 1, ASCII 는 4글자당 1)"""
+    ascii_chars = sum(1 for ch in text if ch.isascii())
+    return (len(text) - ascii_chars) + ascii_chars // 4 + 1
+
+
+async def load_conversation_history(db_session, diary_id: int, token_budget: int) -> dict:
+    """
+    프롬프트용 대화 히스토리를 조회합니다.
+    요약 이후의 메시지는 모두 후보이며, 최근 것부터 배치로 읽다가 token_budget 을 넘기면 멈춥니다. (조회량은 예산으로 제한)
+    반환: {"summary": 요약, "recent": 요약 이후 최근 메시지 목록, "unsummarized_count", "user_response_count"}
+    """
+    summary = await db_session.get(ConversationSummary, diary_id)
+    summarized_until_id = summary.summarized_until_id if summary else 0
+
+    recent = []
+    before_id = None
+    while token_budget > 0:
+        stmt = (
+            select(AIQueryLog.id, AIQueryLog.written_by, AIQueryLog.content)
+            .where(AIQueryLog.diary_id == diary_id, AIQueryLog.id > summarized_until_id)
+            .order_by(AIQueryLog.id.desc())
+            .limit(AI_RECENT_MESSAGES + AI_SUMMARY_BATCH)
+        )
+        if before_id is not None:
+            stmt = stmt.where(AIQueryLog.id < before_id)
+        rows = (await db_session.execute(stmt)).all()
+        for _, written_by, content in rows:
+            recent.append({"by": written_by, "text": content})
+            token_budget -= estimate_tokens(f"{written_by}: {content}")
+            if token_budget <= 0:
+                break
+        if len(rows) < AI_RECENT_MESSAGES + AI_SUMMARY_BATCH:
+            break
+        before_id = rows[-1].id
+    recent.reverse()
+
+    unsummarized_count = await db_session.scalar(
+        select(func.count()).select_from(AIQueryLog).where(
+            AIQueryLog.diary_id == diary_id,
+            AIQueryLog.id > summarized_until_id
+        )
+    )
+    user_response_count = await db_session.scalar(
+        select(func.count()).select_from(AIQueryLog).where(
+            AIQueryLog.diary_id == diary_id,
+            AIQueryLog.written_by == "user"
+        )
+    )
+
+    return {
+        "summary": summary.summary if summary else "",
+        "recent": recent,
+        "unsummarized_count": unsummarized_count,
+        "user_response_count": user_response_count,
+    }
+
+
+async def schedule_summary_if_needed(db_session, diary_id: int, unsummarized_count: int):
+    """요약되지 않은 메시지가 충분히 쌓였으면 요약 갱신 작업을 등록합니다. (커밋은 호출한 쪽에서)"""
+    if unsummarized_count < AI_RECENT_MESSAGES + AI_SUMMARY_BATCH:
+        return
+    latest = await get_latest_job(db_session, CONVERSATION_SUMMARY_JOB, diary_id)
+    if latest and latest.status in ("pending", "running"):
+        return
+    enqueue_job(db_session, CONVERSATION_SUMMARY_JOB, diary_id)
+
+
+def build_summary_prompt(previous_summary: str, messages: list) -> str:
+    lines = [f"{chat['by']}: {chat['text']}" for chat in messages]
+    return "\n".join([
+        "다음은 사용자와 일기 작성 도우미 AI의 대화입니다.",
+        "기존 요약과 새 대화를 합쳐, 일기 작성에 필요한 사실(한 일, 장소, 함께한 사람, 감정)을 빠짐없이 담은 한국어 요약을 10문장 이내로 작성하세요.",
+        "",
+        "기존 요약:",
+        previous_summary or "(없음)",
+        "",
+        "새 대화:",
+        *lines,
+        "",
+        "요약:",
+    ])
+
+
+# 작업 큐 핸들러: 최근 메시지를 제외한 오래된 대화를 요약에 접어 넣음
+async def update_conversation_summary(diary_id: int):
+    async with get_async_db_session() as db_session:
+        summary = await db_session.get(ConversationSummary, diary_id)
+        previous_summary = summary.summary if summary else ""
+        summarized_until_id = summary.summarized_until_id if summary else 0
+
+        unsummarized = await db_session.scalar(
+            select(func.count()).select_from(AIQueryLog).where(
+                AIQueryLog.diary_id == diary_id,
+                AIQueryLog.id > summarized_until_id
+            )
+        )
+        fold_count = min(unsummarized - AI_RECENT_MESSAGES, AI_SUMMARY_MAX_FOLD)
+        if fold_count <= 0:
+            return
+        rows = (await db_session.execute(
+            select(AIQueryLog.id, AIQueryLog.written_by, AIQueryLog.content)
+            .where(AIQueryLog.diary_id == diary_id, AIQueryLog.id > summarized_until_id)
+            .order_by(AIQueryLog.created_at, AIQueryLog.id)
+            .limit(fold_count)
+        )).all()
+
+    # Gemini 호출 동안에는 DB 커넥션을 잡고 있지 않음
+    prompt = build_summary_prompt(previous_summary, [{"by": by, "text": text} for _, by, text in rows])
+    response = await generate_content_async(prompt)
+    if not response.text:
+        raise ValueError("요약 결과가 비어 있습니다.")
+
+    async with get_async_db_session() as db_session:
+        summary = await db_session.get(ConversationSummary, diary_id)
+        if summary is None:
+            summary = ConversationSummary(diary_id=diary_id)
+            db_session.add(summary)
+        elif summary.summarized_until_id != summarized_until_id:
+            # 그 사이 다른 작업이 요약을 갱신함
+            return
+        summary.summary = response.text.strip()
+        summary.summarized_until_id = max(row.id for row in rows)
+        summary.updated_at = datetime.utcnow()
+        await db_session.commit()
+    print(f"대화 요약 갱신: 일기 {diary_id} (메시지 {len(rows)}개 반영)")
+
+
+async def delete_conversation_summary(db_session, diary_id: int):
+    """일기 삭제 시 요약도 함께 삭제합니다. (커밋은 호출한 쪽에서)"""
+    await db_session.execute(delete(ConversationSummary).where(ConversationSummary.diary_id == diary_id))
@@ -0,0 +1,104 @@
+"""
+백그라운드 작업 워커
+
+BackgroundJob 테이블에서 작업을 가져와 처리합니다. (예: Gemini 사진 설명 생성, 첫 AI 질문 미리 생성, 기존 사진 축소본 생성)
+실행: python -m backend.worker
+"""
+
+import asyncio
+import os
+from backend.dependencies.db import get_async_db_session, dispose_engine
+from backend.services.gemini_service import init_gemini_client, close_gemini_client
+from backend.services.image_service import shutdown_image_executor
+from backend.services.ai_service import OPENING_QUESTION_JOB, pregenerate_opening_question
+from backend.services.job_service import JobDeferred, claim_next_job, complete_job, defer_job, fail_job, purge_finished_jobs
+from backend.services.photo_service import (
+    PHOTO_DESCRIPTION_JOB, PHOTO_DERIVATIVES_JOB, describe_photo, mark_photo_description_failed, backfill_photo_derivatives
+)
+from backend.services.summary_service import CONVERSATION_SUMMARY_JOB, update_conversation_summary
+
+# 워커 프로세스당 동시에 처리할 작업 수
+WORKER_CONCURRENCY = int(os.getenv('WORKER_CONCURRENCY', '4'))
+# 처리할 작업이 없을 때 다시 조회하기까지 대기 시간 (초)
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '1.0'))
+# 작업 하나의 최대 실행 시간 (초)
+JOB_TIMEOUT_SECONDS = float(os.getenv('JOB_TIMEOUT_SECONDS', '120'))
+# 보관 기간이 지난 완료 작업을 정리하는 간격 (초)
+JOB_PURGE_INTERVAL_SECONDS = float(os.getenv('JOB_PURGE_INTERVAL_SECONDS', '3600'))
+
+# 작업 종류 → (처리 함수, 재시도를 모두 실패했을 때 호출할 함수)
+JOB_HANDLERS = {
+    PHOTO_DESCRIPTION_JOB: (describe_photo, mark_photo_description_failed),
+    OPENING_QUESTION_JOB: (pregenerate_opening_question, None),
+    CONVERSATION_SUMMARY_JOB: (update_conversation_summary, None),
+    PHOTO_DERIVATIVES_JOB: (backfill_photo_derivatives, None),
+}
+
+
+async def run_job(job):
+    handler, on_failed = JOB_HANDLERS.get(job.kind, (None, None))
+    try:
+        if handler is None:
+            raise ValueError(f"알 수 없는 작업 종류: {job.kind}")
+        await asyncio.wait_for(handler(job.target_id), timeout=JOB_TIMEOUT_SECONDS)
+    except JobDeferred as e:
+        print(f"⏳ 작업 연기: {job.kind}#{job.target_id} ({e.delay_seconds}초 후, {e})")
+        async with get_async_db_session() as db:
+            db.add(job)
+            await defer_job(db, job, e.delay_seconds)
+        return
+    except Exception as e:
+        print(f"❌ 작업 실패: {job.kind}#{job.target_id} (시도 {job.attempts}/{job.max_attempts}): {e}")
+        async with get_async_db_session() as db:
+            db.add(job)
+            retry = await fail_job(db, job, f"{type(e).__name__}: {e}")
+        if not retry and on_failed:
+            await on_failed(job.target_id)
+        return
+
+    async with get_async_db_session() as db:
+        db.add(job)
+        await complete_job(db, job)
+    print(f"✅ 작업 완료: {job.kind}#{job.target_id}")
+
+
+async def worker_loop(worker_no: int):
+    while True:
+        try:
+            async with get_async_db_session() as db:
+                job = await claim_next_job(db)
+            if not job:
+                await asyncio.sleep(JOB_POLL_INTERVAL)
+                continue
+            await run_job(job)
+        except Exception as e:
+            # DB 연결 오류 등: 잠시 후 다시 시도
+            print(f"❌ 워커 {worker_no} 오류: {e}")
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+
+
+async def purge_loop():
+    while True:
+        try:
+            async with get_async_db_session() as db:
+                purged = await purge_finished_jobs(db)
+            if purged:
+                print(f"🧹 완료된 작업 {purged}개 정리")
+        except Exception as e:
+            print(f"❌ 작업 정리 오류: {e}")
+        await asyncio.sleep(JOB_PURGE_INTERVAL_SECONDS)
+
+
+async def main():
+    print(f"🚀 작업 워커 시작 (동시 처리 {WORKER_CONCURRENCY}개)")
+    init_gemini_client()
+    try:
+        await asyncio.gather(purge_loop(), *(worker_loop(i) for i in range(WORKER_CONCURRENCY)))
+    finally:
+        await close_gemini_client()
+        shutdown_image_executor()
+        await dispose_engine()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -579,7 +579,7 @@ class _AIDialogModalState extends State<AIDialogModal> {
       }
 
       final response = await http.post(
-        Uri.parse('https://mydiary-main.up.railway.app/ai/ai_logs/${widget.diaryId}'),
+        Uri.parse('https://mydiary-main.up.railway.app/ai/ai_logs/${widget.diaryId}?only_new=true'),
         headers: {
           'Authorization': 'Bearer $token',
           'Content-Type': 'application/json',